@@ -0,0 +1,79 @@
+"""Compare pandas ``isin``/``between`` masks against ``FilterIndex`` at growing row counts.
+
+    python benchmarks/bench_filters.py [--base-rows 5000] [--scales 1 10 100] [--repeat 20]
+
+Frames are synthetic, shaped like the Inventory sheet (lots, qualities, years,
+half-foot heights); no workbook is needed.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sptf_core.index import FilterIndex  # noqa: E402
+
+
+def synthetic_inventory(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "Lot": rng.integers(1, 41, rows),
+            "Quality": pd.Categorical(rng.choice(["A", "B", "Cut"], rows, p=[0.6, 0.3, 0.1])),
+            "Tree Height (ft)": rng.integers(1, 50, rows) / 2,
+            "Inventory Year": rng.integers(2018, 2026, rows),
+            "Count": rng.integers(1, 60, rows),
+        }
+    )
+
+
+def median_ms(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-rows", type=int, default=5000)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    lots, qualities, years, heights = [7], ["A", "B"], [2024, 2025], (4.0, 12.0)
+    print(f"{'rows':>10} {'build ms':>10} {'pandas ms':>10} {'index ms':>10} {'speedup':>8}")
+    for scale in args.scales:
+        frame = synthetic_inventory(args.base_rows * scale)
+
+        def with_pandas():
+            return frame[
+                frame["Lot"].isin(lots)
+                & frame["Tree Height (ft)"].between(*heights)
+                & frame["Quality"].isin(qualities)
+                & frame["Inventory Year"].isin(years)
+            ]
+
+        start = time.perf_counter()
+        index = FilterIndex(frame, ["Lot", "Quality", "Inventory Year"], "Tree Height (ft)")
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def with_index():
+            return index.filter({"Lot": lots, "Quality": qualities, "Inventory Year": years}, between=heights)
+
+        assert with_pandas().index.equals(with_index().index)
+        pandas_ms = median_ms(with_pandas, args.repeat)
+        index_ms = median_ms(with_index, args.repeat)
+        print(f"{len(frame):>10} {build_ms:>10.1f} {pandas_ms:>10.2f} {index_ms:>10.2f} {pandas_ms / index_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Time every page's hot path on generated workbooks and compare runs.
+
+    python benchmarks/bench_pages.py [--rows 1000 10000 100000] [--repeat 20] [--out bench.json]
+    python benchmarks/bench_pages.py --compare old.json new.json [--threshold 0.2]
+
+For each size a synthetic encrypted workbook is written with
+``make_workbook.py`` and the following stages are timed:
+
+* ``load.cold``: decrypt with an empty key cache and parse every sheet from the XLSX
+* ``load.warm_key``: the same with the derived key cached
+* ``load.snapshot``: the same reading the sealed Arrow snapshots (skipped without pyarrow)
+* ``derive``: normalize the sheets and build the inventory cube, sales cube and planting arrays
+* ``<page>.query``: the page's query and every chart frame for its default sidebar state
+* ``<page>.figures``: Plotly figure construction from those frames
+* ``inventory.export``: writing the per-lot work lists for the default selection (XLSX and zipped CSV)
+
+Each stage reports p50/p95 latency in ms and its tracemalloc peak in MB. The
+JSON report can be diffed against an earlier one with ``--compare``, which
+exits 1 when a stage's p95 or peak memory grew by more than ``--threshold``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import plotly.express as px
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from make_workbook import write_workbook  # noqa: E402
+from sptf_core import snapshot  # noqa: E402
+from sptf_core.crypto import key_cache  # noqa: E402
+from sptf_core.planting import build_planting  # noqa: E402
+from sptf_core.cube import build_inventory_cube  # noqa: E402
+from sptf_core.query import InventoryFilter, PlantingFilter, SalesFilter, query_inventory, query_planting, query_sales  # noqa: E402
+from sptf_core.sales import build_sales_cube  # noqa: E402
+from sptf_core.schema import INVENTORY_COLUMNS, SALES_COLUMNS, normalize_inventory, normalize_sales  # noqa: E402
+from sptf_core.workbook import LazyWorkbook  # noqa: E402
+from sptf_core.worklist import SummaryTable, write_worklists  # noqa: E402
+
+PASSWORD = "secret"
+SHEETS = {"Inventory": INVENTORY_COLUMNS, "Sales": SALES_COLUMNS, "Planting": None}
+NOISE_MS = 1.0
+
+
+def parse_all(path):
+    workbook = LazyWorkbook(path, PASSWORD)
+    for name, columns in SHEETS.items():
+        workbook.sheet(name, columns=columns)
+    return workbook
+
+
+def load_cold(path):
+    key_cache.clear()
+    return parse_all(path)
+
+
+def derive(workbook):
+    build_inventory_cube(normalize_inventory(workbook.sheet("Inventory", columns=INVENTORY_COLUMNS)))
+    build_sales_cube(normalize_sales(workbook.sheet("Sales", columns=SALES_COLUMNS)))
+    build_planting(workbook["Planting"])
+
+
+# Default sidebar state of each page, as sptf.py sets it up on first visit
+
+def inventory_frames(workbook):
+    years = query_inventory(workbook).year_totals().index.tolist()
+    result = query_inventory(workbook, InventoryFilter(qualities=("A", "B"), years=tuple(years)))
+    return {
+        "year_totals": result.year_totals(),
+        "height": result.by_height(),
+        "pies": [result.height_bins(year) for year in years],
+        "lot": result.by_lot(),
+        "summary": SummaryTable(result.cells).page(0),
+    }
+
+
+def inventory_export(workbook, directory):
+    years = query_inventory(workbook).year_totals().index.tolist()
+    cells = query_inventory(workbook, InventoryFilter(qualities=("A", "B"), years=tuple(years))).cells
+    for fmt in ("xlsx", "csv"):
+        write_worklists(cells, os.path.join(directory, f"work_lists.{fmt}"), fmt)
+
+
+def sales_frames(workbook):
+    years = sorted(query_sales(workbook).to_dict()["by_year"], key=int)[-2:]
+    result = query_sales(workbook, SalesFilter(years=tuple(int(year) for year in years)))
+    return {
+        "total": result.total("Quantity"),
+        "height": result.by_height("Quantity"),
+        "customer": result.by_customer("Quantity"),
+    }
+
+
+def planting_frames(workbook):
+    result = query_planting(workbook, PlantingFilter())
+    return {
+        "total": result.total(),
+        "height": result.height_by_year(),
+        "pie": result.height_totals(),
+        "lot": result.lot_by_year(),
+    }
+
+
+# Figure construction mirrors the charts in sptf.py
+
+def inventory_figures(frames):
+    for name, x in (("height", "Tree Height (ft)"), ("lot", "Lot")):
+        grouped = frames[name].assign(**{"Inventory Year": frames[name]["Inventory Year"].astype(str)})
+        px.bar(grouped, x=x, y="Count", color="Inventory Year").update_layout(barmode="group")
+    for pie in frames["pies"]:
+        px.pie(pie, names="Tree Height (ft)", values="Count")
+
+
+def sales_figures(frames):
+    grouped = frames["height"].assign(**{"Sales Year": frames["height"]["Sales Year"].astype(str)})
+    px.bar(grouped, x="Tree Height (ft)", y="Quantity", color="Sales Year").update_layout(barmode="group")
+    px.pie(frames["customer"], names="Customer", values="Quantity")
+
+
+def planting_figures(frames):
+    grouped = frames["height"].assign(Year=frames["height"]["Year"].astype(str))
+    px.bar(grouped, x="Tree Height (in)", y="Count", color="Year").update_layout(barmode="group")
+    px.pie(frames["pie"], names="Tree Height (in)", values="Count")
+    lots = frames["lot"].assign(Year=frames["lot"]["Year"].astype(str))
+    px.bar(lots, x="Lot #", y="Count", color="Year").update_layout(barmode="group")
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    # Memory is traced in a separate run so tracing overhead stays out of the timings
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "peak_mb": round(peak / 2**20, 3),
+        "repeat": repeat,
+    }
+
+
+def bench_workbook(path, repeat):
+    load_repeat = max(1, repeat // 4)
+    use_snapshot = snapshot.USE_SNAPSHOT
+    stages = {}
+    try:
+        snapshot.USE_SNAPSHOT = False
+        stages["load.cold"] = measure(lambda: load_cold(path), load_repeat)
+        stages["load.warm_key"] = measure(lambda: parse_all(path), load_repeat)
+        snapshot.USE_SNAPSHOT = use_snapshot
+        if snapshot.snapshot_available():
+            parse_all(path)  # writes the snapshots
+            stages["load.snapshot"] = measure(lambda: parse_all(path), load_repeat)
+    finally:
+        snapshot.USE_SNAPSHOT = use_snapshot
+
+    workbook = parse_all(path)
+    stages["derive"] = measure(lambda: derive(workbook), load_repeat)
+    for page, frames, figures in (
+        ("inventory", inventory_frames, inventory_figures),
+        ("sales", sales_frames, sales_figures),
+        ("planting", planting_frames, planting_figures),
+    ):
+        built = frames(workbook)  # builds the workbook's derived datasets once, as the first page visit does
+        stages[f"{page}.query"] = measure(lambda: frames(workbook), repeat)
+        stages[f"{page}.figures"] = measure(lambda: figures(built), repeat)
+    with tempfile.TemporaryDirectory() as directory:
+        stages["inventory.export"] = measure(lambda: inventory_export(workbook, directory), load_repeat)
+    return stages
+
+
+def run(rows_list, repeat, seed=0):
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in rows_list:
+            path = os.path.join(directory, f"bench_{rows}.xlsx")
+            write_workbook(path, rows, password=PASSWORD, seed=seed)
+            report["results"][str(rows)] = bench_workbook(path, repeat)
+            for stage, stats in report["results"][str(rows)].items():
+                print(f"{rows:>9} {stage:<18} p50 {stats['p50_ms']:>10.2f} ms  p95 {stats['p95_ms']:>10.2f} ms  peak {stats['peak_mb']:>8.1f} MB", file=sys.stderr)
+    # ru_maxrss is KiB on Linux
+    report["meta"]["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def compare(old, new, threshold):
+    """Return ``(size, stage, metric, old, new)`` for every stage that regressed by more than ``threshold``."""
+    regressions = []
+    for rows, stages in new["results"].items():
+        for stage, stats in stages.items():
+            before = old["results"].get(rows, {}).get(stage)
+            if before is None:
+                continue
+            if stats["p95_ms"] > before["p95_ms"] * (1 + threshold) and stats["p95_ms"] - before["p95_ms"] > NOISE_MS:
+                regressions.append((rows, stage, "p95_ms", before["p95_ms"], stats["p95_ms"]))
+            if stats["peak_mb"] > before["peak_mb"] * (1 + threshold) and stats["peak_mb"] - before["peak_mb"] > 1:
+                regressions.append((rows, stage, "peak_mb", before["peak_mb"], stats["peak_mb"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two reports instead of running")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative growth before flagging (default 0.2)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            regressions = compare(json.load(old_file), json.load(new_file), args.threshold)
+        for rows, stage, metric, before, after in regressions:
+            print(f"REGRESSION {rows:>9} {stage:<18} {metric}: {before} -> {after} ({after / before - 1:+.0%})")
+        if not regressions:
+            print("no regressions")
+        return 1 if regressions else 0
+
+    report = run(args.rows, args.repeat, seed=args.seed)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""Drive many simultaneous app sessions and report how the server holds up.
+
+    python benchmarks/bench_sessions.py [--sessions 1 2 4 8 16] [--rows 10000] [--out sessions.json]
+
+A synthetic encrypted workbook is written with ``make_workbook.py`` and
+``sptf.py`` is pointed at it through ``SPTF_WORKBOOK``. For each session
+count, that many ``AppTest`` sessions are started at once, each on its own
+thread, all in this process so they share the workbook cache, figure cache
+and scenario pool the way sessions of one server do. Every session enters
+the password, waits for the unlock, then visits each page and changes its
+filters (``SCRIPT``).
+
+Per session count it reports:
+
+* ``unlock``: p50/p95 from entering the password until the first page is shown
+* ``rerun``: p50/p95/p99 of every scripted rerun (page switch or filter change)
+* ``throughput``: reruns per second across all sessions
+* ``rss_per_session_mb``: growth of this process's resident memory while the
+  sessions are alive, divided by the number of sessions
+
+The workbook is unlocked once before the first round, so every round measures
+sessions joining a warm server rather than the first decrypt.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# sptf_core.workbook reads SPTF_WORKBOOK when it is first imported, which make_workbook already does
+WORKDIR = tempfile.mkdtemp(prefix="sptf-sessions-")
+WORKBOOK = os.environ["SPTF_WORKBOOK"] = os.path.join(WORKDIR, "sessions.xlsx")
+
+from make_workbook import write_workbook  # noqa: E402
+
+PASSWORD = "secret"
+APP = os.path.join(ROOT, "sptf.py")
+
+
+def rss_mb():
+    """Resident memory of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _find(elements, label):
+    return next((element for element in elements if element.label == label), None)
+
+
+def _narrow(slider, step):
+    low, high = slider.value
+    return slider.set_value((low, max(low, high - step)))
+
+
+def _next_option(widget):
+    if widget is not None and not widget.disabled and len(widget.options) > 1:
+        widget.set_value(widget.options[1])
+
+
+# Filter changes per page, each followed by one rerun
+SCRIPT = {
+    "Current Inventory": [
+        lambda at: _next_option(_find(at.sidebar.selectbox, "Select Lot (see Lot Map)")),
+        lambda at: _find(at.sidebar.multiselect, "Select Quality").set_value(["A"]),
+        lambda at: _narrow(at.slider(key="inventory_height_slider_unique"), 1.0),
+        lambda at: at.selectbox(key="summary_sort_unique").set_value("Count"),
+    ],
+    "Inventory Changes": [
+        lambda at: _next_option(at.selectbox(key="changes_lot_unique")),
+    ],
+    "Historical Sales": [
+        lambda at: _narrow(at.slider(key="sales_height_slider_unique"), 1.0),
+        lambda at: _next_option(_find(at.sidebar.selectbox, "Select Customer")),
+        lambda at: _find(at.sidebar.radio, "Select Metric").set_value("Revenue"),
+    ],
+    "Planting History": [
+        lambda at: _next_option(_find(at.sidebar.selectbox, "Select Lot")),
+        lambda at: _narrow(at.slider(key="planting_height_slider_unique"), 6),
+    ],
+    "Projected Inventory": [
+        lambda at: at.slider(key="projection_years_slider_unique").set_value(10),
+    ],
+    "Harvest Planning": [
+        lambda at: at.slider(key="planning_tolerance_unique").set_value(1.0),
+    ],
+    "Lot Map": [
+        lambda at: _next_option(_find(at.sidebar.selectbox, "Colour Lots by Inventory Year")),
+    ],
+}
+
+
+def share_server():
+    """Give every session the one Runtime and script cache a server has.
+
+    ``AppTest`` installs a mock Runtime when a run starts and removes it when
+    the run ends, which would pull it from under runs on other threads; the
+    first one installed is kept and returned from then on. It also compiles
+    the script into a new cache on every run, and compiling on several threads
+    at once is not safe on every Python version.
+    """
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared = []
+
+    def instance(cls):
+        if not shared:
+            if cls._instance is None:
+                raise RuntimeError("Runtime hasn't been created!")
+            shared.append(cls._instance)
+        return shared[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: bool(shared) or cls._instance is not None)
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+class Session:
+    def __init__(self, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP, default_timeout=timeout)
+        self.unlock_ms = None
+        self.rerun_ms = []
+        self.errors = []
+
+    def _rerun(self, action=None):
+        start = time.perf_counter()
+        if action is not None:
+            action(self.app)
+        self.app.run()
+        self.rerun_ms.append((time.perf_counter() - start) * 1000)
+        self.errors.extend(element.value for element in self.app.exception)
+
+    def _loading(self):
+        return not self.app.sidebar.radio or len(self.app.get("progress")) > 0
+
+    def unlock(self, poll=0.05, limit=120):
+        self.app.run()
+        start = time.perf_counter()
+        self.app.text_input[0].set_value(PASSWORD).run()
+        while self._loading():
+            if self.app.error or time.perf_counter() - start > limit:
+                raise RuntimeError("the app did not unlock")
+            time.sleep(poll)
+            self.app.run()
+        self.unlock_ms = (time.perf_counter() - start) * 1000
+
+    def browse(self):
+        for page, actions in SCRIPT.items():
+            self._rerun(lambda at: at.sidebar.radio[0].set_value(page))
+            for action in actions:
+                self._rerun(action)
+
+
+def _percentiles(values, quantiles):
+    if not values:
+        return {f"p{q}_ms": None for q in quantiles}
+    return {f"p{q}_ms": round(float(v), 2) for q, v in zip(quantiles, np.percentile(values, quantiles))}
+
+
+def run_round(count, timeout):
+    """Run ``count`` sessions at once and summarize them."""
+    gc.collect()
+    rss_before = rss_mb()
+    sessions = [Session(timeout) for _ in range(count)]
+    start_line = threading.Barrier(count)
+    failures = []
+
+    def drive(session):
+        try:
+            start_line.wait()
+            session.unlock()
+            session.browse()
+        except Exception as exc:
+            failures.append(repr(exc))
+
+    threads = [threading.Thread(target=drive, args=(session,), name=f"sptf-session-{i}") for i, session in enumerate(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    rss_after = rss_mb()
+
+    reruns = [ms for session in sessions for ms in session.rerun_ms]
+    result = {
+        "sessions": count,
+        "unlock": _percentiles([s.unlock_ms for s in sessions if s.unlock_ms is not None], (50, 95)),
+        "rerun": _percentiles(reruns, (50, 95, 99)),
+        "reruns": len(reruns),
+        "wall_s": round(wall, 2),
+        "throughput": round(len(reruns) / wall, 2),
+        "rss_before_mb": round(rss_before, 1),
+        "rss_after_mb": round(rss_after, 1),
+        "rss_per_session_mb": round((rss_after - rss_before) / count, 2),
+        "errors": sorted(set(failures + [str(e) for s in sessions for e in s.errors])),
+    }
+    del sessions
+    return result
+
+
+def run(counts, rows, timeout, seed=0):
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "rows": rows,
+        },
+        "results": [],
+    }
+    try:
+        write_workbook(WORKBOOK, rows, password=PASSWORD, seed=seed)
+        share_server()
+        # Its first run installs the shared Runtime before sessions run concurrently
+        warm = Session(timeout)
+        warm.unlock()
+        del warm
+        for count in counts:
+            result = run_round(count, timeout)
+            report["results"].append(result)
+            print(
+                f"{count:>4} sessions  unlock p50 {result['unlock']['p50_ms']:>9.1f} ms  "
+                f"rerun p50 {result['rerun']['p50_ms']:>8.1f} p95 {result['rerun']['p95_ms']:>8.1f} p99 {result['rerun']['p99_ms']:>8.1f} ms  "
+                f"{result['throughput']:>7.2f} reruns/s  +{result['rss_per_session_mb']:.1f} MB/session  "
+                f"{len(result['errors'])} errors",
+                file=sys.stderr,
+            )
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--rows", type=int, default=10000, help="inventory rows in the generated workbook")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds one rerun may take before a session fails")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The app opens its map image relative to the working directory, as under `streamlit run`
+    os.chdir(ROOT)
+    report = run(args.sessions, args.rows, args.timeout, seed=args.seed)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+    return 1 if any(result["errors"] for result in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Time a cold unlock (key derivation + decrypt) against a warm one (cached key + decrypt).
+
+    python benchmarks/bench_unlock.py [--path SPTF_Inventory_25.xlsx] [--repeat 5]
+
+The password is read from ``SPTF_PASSWORD`` or prompted for.
+"""
+
+import argparse
+import getpass
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sptf_core.crypto import KeyCache, decrypt_workbook  # noqa: E402
+from sptf_core.workbook import WORKBOOK_PATH  # noqa: E402
+
+
+def time_unlock(path, password, keys):
+    start = time.perf_counter()
+    with open(path, "rb") as file:
+        decrypt_workbook(file, password, keys=keys)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default=WORKBOOK_PATH)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    password = os.environ.get("SPTF_PASSWORD") or getpass.getpass("Excel File Password: ")
+
+    cold = [time_unlock(args.path, password, KeyCache()) for _ in range(args.repeat)]
+    keys = KeyCache()
+    time_unlock(args.path, password, keys)
+    warm = [time_unlock(args.path, password, keys) for _ in range(args.repeat)]
+
+    cold_ms = statistics.median(cold) * 1000
+    warm_ms = statistics.median(warm) * 1000
+    print(f"cold unlock: {cold_ms:8.1f} ms (median of {args.repeat})")
+    print(f"warm unlock: {warm_ms:8.1f} ms (median of {args.repeat})")
+    print(f"speedup:     {cold_ms / warm_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
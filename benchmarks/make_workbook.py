@@ -0,0 +1,93 @@
+"""Write a synthetic, password-protected workbook with the same sheets as SPTF_Inventory_25.xlsx.
+
+    python benchmarks/make_workbook.py out.xlsx --rows 100000 [--password secret] [--seed 0]
+
+``--rows`` is the Inventory row count; Sales gets half as many rows and
+Planting a tenth. Sales before 2023 have no Quality or Customer, as in the
+real workbook.
+"""
+
+import argparse
+import io
+import os
+import sys
+
+import numpy as np
+import openpyxl
+from msoffcrypto.format.ooxml import OOXMLFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sptf_core.schema import INVENTORY_COLUMNS, SALES_COLUMNS  # noqa: E402
+
+PLANTING_HEIGHTS = ["12", "18", "24", "30", "36"]
+CUSTOMERS = ["Bayview Landscaping", "Coastal Nursery", "Hillside Garden Center", "Northwoods Supply", "Pine Ridge Homes", "Valley Farms"]
+
+
+def generate_sheets(rows, seed=0):
+    """Return ``{sheet name: list of row tuples}`` (header first) for a workbook with ``rows`` inventory rows."""
+    rng = np.random.default_rng(seed)
+    lots = max(8, int(np.sqrt(rows) / 2))
+
+    inventory = [tuple(INVENTORY_COLUMNS)]
+    years = rng.integers(2023, 2026, rows)
+    lot = rng.integers(1, lots + 1, rows)
+    row = rng.integers(1, 31, rows)
+    quality = rng.choice(["A", "B", "Cut"], rows, p=[0.6, 0.3, 0.1])
+    height = rng.integers(2, 50, rows) / 2
+    count = rng.integers(1, 60, rows)
+    for values in zip(lot, row, quality, height, count, years):
+        inventory.append((int(values[0]), int(values[1]), str(values[2]), float(values[3]), int(values[4]), int(values[5])))
+
+    sales_rows = max(1, rows // 2)
+    sales = [tuple(SALES_COLUMNS)]
+    sale_year = rng.integers(2015, 2026, sales_rows)
+    sale_height = rng.integers(8, 20, sales_rows) / 2
+    sale_quality = rng.choice(["A", "B"], sales_rows, p=[0.7, 0.3])
+    customer = rng.choice(CUSTOMERS, sales_rows)
+    quantity = rng.integers(1, 80, sales_rows)
+    price = rng.choice([25.0, 35.0, 45.0, 60.0], sales_rows)
+    for year, h, q, c, n, p in zip(sale_year, sale_height, sale_quality, customer, quantity, price):
+        detailed = year >= 2023
+        sales.append((int(year), float(h), str(q) if detailed else None, str(c) if detailed else None, int(n), float(p)))
+
+    planting_rows = max(1, rows // 10)
+    planting = [("Date", "Lot #", "Row #", *PLANTING_HEIGHTS)]
+    plant_year = rng.integers(2015, 2026, planting_rows)
+    plant_day = rng.integers(0, 45, planting_rows)
+    plant_lot = rng.integers(1, lots + 1, planting_rows)
+    plant_row = rng.integers(1, 31, planting_rows)
+    counts = rng.choice([0, 0, 0, 25, 50, 100], (planting_rows, len(PLANTING_HEIGHTS)))
+    for year, day, lot_no, row_no, per_height in zip(plant_year, plant_day, plant_lot, plant_row, counts):
+        date = np.datetime64(f"{year}-04-15") + np.timedelta64(int(day), "D")
+        planting.append((date.item(), int(lot_no), int(row_no), *(int(c) if c else None for c in per_height)))
+
+    return {"Inventory": inventory, "Sales": sales, "Planting": planting}
+
+
+def write_workbook(path, rows, password="secret", seed=0):
+    workbook = openpyxl.Workbook(write_only=True)
+    for name, values in generate_sheets(rows, seed).items():
+        sheet = workbook.create_sheet(name)
+        for row in values:
+            sheet.append(row)
+    plain = io.BytesIO()
+    workbook.save(plain)
+    plain.seek(0)
+    with open(path, "wb") as out:
+        OOXMLFile(plain).encrypt(password, out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_workbook(args.path, args.rows, password=args.password, seed=args.seed)
+    print(f"wrote {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB, {args.rows} inventory rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,67 @@
+import dataclasses
+import functools
+
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-import msoffcrypto
-import io
+
+from sptf_core import (
+    InventoryFilter,
+    PlantingFilter,
+    ProjectionFilter,
+    SalesFilter,
+    ScenarioPlan,
+    SummaryTable,
+    allocate_orders,
+    figure_cache,
+    inventory_dataset,
+    inventory_deltas,
+    normalize_filters,
+    planting_dataset,
+    query_inventory,
+    query_planting,
+    query_projection,
+    query_sales,
+    run_scenarios,
+    sales_dataset,
+    start_export,
+    start_unlock,
+    timing,
+)
+from sptf_core.allocation import frame_orders, orders_frame, sales_orders
+from sptf_core.cube import HEIGHT_BIN_LABELS
+from sptf_core.deltas import DELTA_MEASURES, pair_label
+from sptf_core.lotmap import lot_overlay, map_tiles, tile_path, viewer_html
+from sptf_core.worklist import EXPORT_FORMATS, PAGE_SIZES
 
 # Streamlit page configuration
 st.set_page_config(layout="wide")
 
-# Load password-protected Excel file
-def load_data(password):
-    file_path = "SPTF_Inventory_25.xlsx"
-    try:
-        with open(file_path, "rb") as file:
-            decrypted = io.BytesIO()
-            office_file = msoffcrypto.OfficeFile(file)
+# Per-rerun timing spans, collected when SPTF_TIMING=1 or the URL has ?perf=1
+timing_on = timing.ENABLED or st.query_params.get("perf") == "1"
+# A run stopped by st.rerun()/st.stop() never reaches timing.end(), so start every run clean
+timing.reset()
+rerun = timing.begin("Password") if timing_on else None
 
-            if not office_file.is_encrypted():
-                return pd.read_excel(file_path, sheet_name=None)
+# Load password-protected Excel file on a worker thread (decrypted once per process and shared by all sessions)
+def load_data(password):
+    return start_unlock(password, record=timing_on)
 
-            office_file.load_key(password)
-            office_file.decrypt(decrypted)
-            return pd.read_excel(decrypted, sheet_name=None)
-    except Exception:
-        return None
+# Shows how far the unlock has got and reruns the app once the password is checked and `sheets` are loaded
+@st.fragment(run_every=0.3)
+def unlock_progress(job, sheets=()):
+    if job.error is not None or job.ready(sheets):
+        st.rerun()
+    fraction, stage = job.progress(sheets)
+    st.progress(fraction, text=f"{stage}...")
+
+# A finished password check either unlocks the app or reports the error
+unlock_job = st.session_state.get("unlock")
+if "data" not in st.session_state and unlock_job is not None:
+    if unlock_job.unlocked:
+        st.session_state["data"] = unlock_job.handle
+    elif unlock_job.error is not None:
+        st.session_state["password_error"] = True
+        del st.session_state["unlock"]
 
 # User enters password
 if "data" not in st.session_state:
@@ -31,12 +70,8 @@ if "data" not in st.session_state:
     def submit_password():
         password = st.session_state.password_input
         if password:
-            data = load_data(password)
-            if data is None:
-                st.session_state["password_error"] = True
-            else:
-                st.session_state["data"] = data
-                st.session_state["password_error"] = False
+            st.session_state["unlock"] = load_data(password)
+            st.session_state["password_error"] = False
 
     if "password_error" not in st.session_state:
         st.session_state["password_error"] = False
@@ -48,260 +83,633 @@ if "data" not in st.session_state:
 
     if st.session_state.get("password_error"):
         st.error("Incorrect password or file issue. Please try again.")
-    elif "data" in st.session_state:
-        st.rerun()
+    elif "unlock" in st.session_state:
+        unlock_progress(st.session_state["unlock"])
 
+    if rerun is not None:
+        timing.end(rerun)
     st.stop()
 
 # Ensure data is available before proceeding
 if "data" in st.session_state:
-    sheets = st.session_state["data"]
-    data = sheets["Inventory"]
-    sales_data = sheets["Sales"]
+    # The handle follows the file on disk; take one version for the whole rerun
+    # (sheets are parsed on first use by the page that needs them)
+    sheets = st.session_state["data"].current
 else:
     st.stop()
 
+if st.session_state.get("data_version") not in (None, sheets.version):
+    st.toast("The workbook was updated - showing the latest data.")
+st.session_state["data_version"] = sheets.version
+
 # Sidebar navigation
 st.sidebar.title("Navigation")
-page = st.sidebar.radio("Go To", ["Current Inventory", "Historical Sales", "Planting History", "Lot Map"])
+page = st.sidebar.radio("Go To", ["Current Inventory", "Inventory Changes", "Historical Sales", "Planting History", "Projected Inventory", "Harvest Planning", "Lot Map"])
+if rerun is not None:
+    rerun.page = page
+
+# Sheets each page reads; its figures are only rebuilt when one of these changes
+PAGE_SHEETS = {
+    "Current Inventory": ("Inventory",),
+    "Inventory Changes": ("Inventory", "Sales"),
+    "Historical Sales": ("Sales",),
+    "Planting History": ("Planting",),
+    "Projected Inventory": ("Inventory", "Sales"),
+    "Harvest Planning": ("Inventory", "Sales"),
+}
+
+# Data pages wait for their sheets while the unlock is still loading them in the background
+if page in PAGE_SHEETS and "unlock" in st.session_state and not st.session_state["unlock"].ready(PAGE_SHEETS[page]):
+    st.title(page)
+    unlock_progress(st.session_state["unlock"], PAGE_SHEETS[page])
+    if rerun is not None:
+        timing.end(rerun)
+    st.stop()
+
+# Figures are shared across sessions, keyed by page, chart, sheet versions and filter state
+def show_chart(chart, filters, build):
+    with timing.span(f"figure {chart}"):
+        fig = figure_cache.get_or_build((page, chart, sheets.sheet_version(*PAGE_SHEETS[page]), filters), build)
+    with timing.span(f"plotly_chart {chart}"):
+        st.plotly_chart(fig)
+
+# Pages, and the parts of a page with widgets of their own, are sections: fragments, so a widget
+# change reruns only the section that owns it. A section's arguments are the inputs it reads from
+# the rest of the page; the page passes them in and reruns the section when they change. A section
+# that reruns on its own is timed as its own rerun ("<page> / <section>").
+def section(name):
+    def decorate(render):
+        @st.fragment
+        @functools.wraps(render)
+        def run(*args):
+            # A hot-reloaded workbook reruns the whole app so every section shows the same version
+            if st.session_state["data"].current.version != st.session_state["data_version"]:
+                st.rerun()
+            with timing.recording(page if name == page else f"{page} / {name}", enabled=timing_on):
+                with timing.span(f"section {name}"):
+                    render(*args)
+
+        return run
+
+    return decorate
+
+# Only the visible page of the summary table is sent to the browser; sorting and paging rerun just this section
+@section("Summary Table")
+def summary_table(table):
+    sort_col, order_col, size_col, page_col = st.columns(4)
+    sort_by = sort_col.selectbox("Sort By", ["Table Order", *table.frame.columns], key="summary_sort_unique")
+    descending = order_col.selectbox("Order", ["Ascending", "Descending"], key="summary_order_unique") == "Descending"
+    page_size = size_col.selectbox("Rows per Page", PAGE_SIZES, key="summary_page_size_unique")
+    page_count = table.page_count(page_size)
+    page_number = page_col.number_input(f"Page (of {page_count})", 1, page_count, 1, key="summary_page_unique")
+    with timing.span("summary page"):
+        rows = table.page(page_number - 1, page_size, None if sort_by == "Table Order" else sort_by, not descending)
+    st.dataframe(rows, hide_index=True)
+    first = (page_number - 1) * page_size
+    st.caption(f"Rows {min(first + 1, len(table))}-{first + len(rows)} of {len(table)}")
+
+# Shows the export's progress and reruns the app once the file is written
+@st.fragment(run_every=0.3)
+def export_progress(job):
+    if job.done:
+        st.rerun()
+    fraction, stage = job.progress()
+    st.progress(fraction, text=f"{stage}...")
+
+# One work list per lot for the crews, written on a worker thread for the current filters
+@section("Work Lists")
+def work_lists(cells, filters):
+    st.write("### Crew Work Lists")
+    export_format = st.radio("File Format", list(EXPORT_FORMATS), format_func={"xlsx": "Excel (one sheet per lot)", "csv": "CSV (one file per lot, zipped)"}.get, horizontal=True, key="worklist_format_unique")
+    key = (sheets.version, filters, export_format)
+    exported = st.session_state.get("worklist_export")
+    if exported is not None and exported[0] != key:
+        exported[1].discard()
+        del st.session_state["worklist_export"]
+        exported = None
+    if exported is None:
+        if st.button("Prepare Work Lists"):
+            st.session_state["worklist_export"] = exported = (key, start_export(cells, export_format))
+        else:
+            return
+    job = exported[1]
+    if job.error is not None:
+        st.error(f"Could not write the work lists: {job.error}")
+    elif not job.done:
+        export_progress(job)
+    else:
+        st.download_button("Download Work Lists", job.read, file_name=job.file_name, mime=job.mime, on_click="ignore")
 
 # Page logic
 if page == "Current Inventory":
-    st.sidebar.header("Filter Options")
-    height_range = st.sidebar.slider(
-        "Select Tree Height Range (ft)",
-        float(data["Tree Height (ft)"].min()),
-        float(data["Tree Height (ft)"].max()),
-        (float(data["Tree Height (ft)"].min()), float(data["Tree Height (ft)"].max())),
-        0.5,
-        key="inventory_height_slider_unique"
-    )
+    @section(page)
+    def current_inventory_page():
+        with timing.span("dataset"):
+            inventory = inventory_dataset(sheets)
+
+        st.sidebar.header("Filter Options")
+        height_range = st.sidebar.slider(
+            "Select Tree Height Range (ft)",
+            inventory.height_range[0],
+            inventory.height_range[1],
+            inventory.height_range,
+            0.5,
+            key="inventory_height_slider_unique"
+        )
+
+        available_qualities = inventory.qualities
+        default_selection = [q for q in ["A", "B"] if q in available_qualities]
+
+        quality_options = st.sidebar.multiselect("Select Quality", options=available_qualities, default=default_selection)
+
+        st.sidebar.markdown("**A** = Good  \n**B** = Needs Pruning")
+
+        lot_options = ['All'] + inventory.lots
+        selected_lot = st.sidebar.selectbox("Select Lot (see Lot Map)", options=lot_options)
+
+        inventory_years = inventory.years
+        default_years = inventory_years  # Display all years by default
+        selected_years = st.sidebar.multiselect("Select Inventory Year(s)", options=inventory_years, default=default_years)
+
+        inventory_filter = InventoryFilter(lot=selected_lot, height_range=height_range, qualities=tuple(quality_options), years=tuple(selected_years))
+        with timing.span("query"):
+            result = query_inventory(sheets, inventory_filter)
+        filters = inventory_filter.key()
+
+        st.title("Current Tree Inventory")
+        # Display total count by year
+        with timing.span("totals"):
+            year_totals = result.year_totals()
+        total_text = " | ".join([f"{int(year)}: {count}" for year, count in year_totals.items()])
+        st.markdown(f"<h3 style='color:green;'>Total Tree Count Based on Filter Selections: {total_text}</h3>", unsafe_allow_html=True)
+
+        # Bar chart with year colors
+        def height_chart():
+            height_group = result.by_height()
+            height_group["Inventory Year"] = height_group["Inventory Year"].astype(str)
+            fig = px.bar(height_group, x='Tree Height (ft)', y='Count', color='Inventory Year')
+            fig.update_layout(barmode="group")
+            return fig
+
+        show_chart("height", filters, height_chart)
+
+        # Create separate pie charts for each selected year
+        for year in sorted(selected_years):
+            def year_pie(year=year):
+                height_distribution = result.height_bins(year)
+                return px.pie(height_distribution, names="Tree Height (ft)", values="Count", title=f"Tree Distribution by Height ({int(year)})")
+
+            show_chart(f"pie {year}", filters, year_pie)
+
+        if selected_lot == 'All':
+            def lot_chart():
+                lot_group = result.by_lot()
+                lot_group["Inventory Year"] = lot_group["Inventory Year"].astype(str)
+                fig_lot = px.bar(lot_group, x='Lot', y='Count', color='Inventory Year')
+                fig_lot.update_layout(barmode="group")
+                return fig_lot
+
+            show_chart("lot", filters, lot_chart)
+        else:
+            def row_chart():
+                row_group = result.by_row()
+                row_group["Inventory Year"] = row_group["Inventory Year"].astype(str)
+                fig_lot = px.bar(row_group, x='Row', y='Count', color='Inventory Year')
+                fig_lot.update_layout(barmode="group")
+                return fig_lot
+
+            show_chart("row", filters, row_chart)
+
+        with timing.span("summary table"):
+            summary_table(SummaryTable(result.cells))
+        work_lists(result.cells, filters)
+
+    current_inventory_page()
+
+elif page == "Inventory Changes":
+    @section(page)
+    def inventory_changes_page():
+        with timing.span("dataset"):
+            deltas = inventory_deltas(sheets)
+        st.title("Inventory Changes")
+
+        if not deltas.pairs:
+            st.info("At least two inventory years are needed to compare.")
+        else:
+            st.sidebar.header("Change Filters")
+            selected_pair = st.sidebar.selectbox("Compare Inventory Years", deltas.pairs, index=len(deltas.pairs) - 1, format_func=pair_label)
+            lot_options = ["All"] + inventory_dataset(sheets).lots
+            selected_lot = st.sidebar.selectbox("Select Lot (see Lot Map)", options=lot_options, key="changes_lot_unique")
+            filters = normalize_filters(pair=selected_pair, lot=selected_lot)
+
+            with timing.span("query"):
+                change_rows = deltas.select(selected_pair, selected_lot)
+                pair_totals = deltas.pair_totals(selected_pair)
+            st.markdown(
+                f"<h3 style='color:green;'>{pair_label(selected_pair)}: {int(pair_totals['Trees Before'])} → {int(pair_totals['Trees After'])} trees "
+                f"| Lost: {int(pair_totals['Lost'])} | Sold: {int(pair_totals['Sold'])} | Lost Beyond Sales: {int(pair_totals['Lost Beyond Sales'])}</h3>",
+                unsafe_allow_html=True,
+            )
+
+            group_key = "Lot" if selected_lot == "All" else "Row"
+            grouped = deltas.by(change_rows, group_key)
+
+            def change_chart():
+                measures = grouped.melt(id_vars=group_key, value_vars=DELTA_MEASURES, var_name="Change", value_name="Trees")
+                fig = px.bar(measures, x=group_key, y="Trees", color="Change", title=f"Trees Lost, Added and Downgraded by {group_key}")
+                fig.update_layout(barmode="group")
+                return fig
+
+            show_chart("changes", filters, change_chart)
+
+            def growth_chart():
+                return px.bar(grouped, x=group_key, y="Growth (ft)", title=f"Average Height Change by {group_key} (ft)")
+
+            show_chart("growth", filters, growth_chart)
+
+            st.write("### Reconciliation with Sales")
+            st.dataframe(deltas.reconciliation, hide_index=True)
+
+            st.write("### Changes by Row")
+            st.dataframe(change_rows.drop(columns=["From Year", "To Year"]), hide_index=True)
+
+    inventory_changes_page()
+
+elif page == "Lot Map":
+    @section(page)
+    def lot_map_page():
+        st.title("Lot Map")
+        with timing.span("tiles"):
+            tiles = map_tiles()
+
+        if st.get_option("server.enableStaticServing"):
+            # The map shows at once; lots are coloured as soon as the Inventory sheet is loaded
+            unlock_job = st.session_state.get("unlock")
+            overlay = None
+            if unlock_job is None or unlock_job.ready(("Inventory",)):
+                with timing.span("dataset"):
+                    overlay = lot_overlay(sheets)
+
+            @section("Map")
+            def lot_map_viewer(tiles, overlay):
+                shapes = []
+                if overlay is not None and overlay.years:
+                    overlay_year = st.sidebar.selectbox("Colour Lots by Inventory Year", overlay.years[::-1])
+                    shapes = overlay.layer(overlay_year)
+                st.iframe(viewer_html(tiles, shapes), height=620)
+                st.caption("Scroll or use +/− to zoom, drag to pan, and hover over a lot to see its tree count.")
+
+            lot_map_viewer(tiles, overlay)
+            if overlay is None:
+                unlock_progress(unlock_job, ("Inventory",))
+            elif overlay.unmapped:
+                st.caption(f"Lots not outlined on the map: {', '.join(str(lot) for lot in overlay.unmapped)}")
+        else:
+            st.image(tile_path(tiles, f"{tiles['max_zoom']}.webp"))
+
+    lot_map_page()
+
+elif page == "Historical Sales":
+    @section(page)
+    def historical_sales_page():
+        with timing.span("dataset"):
+            sales = sales_dataset(sheets)
+        st.title("Historical Sales")
+
+        st.sidebar.header("Sales Filters")
+        years = sales.years
+        default_years = years[-2:] if len(years) >= 2 else years
+        selected_years = st.sidebar.multiselect("Select Sales Year(s)", years, default=default_years)
+
+        height_range = st.sidebar.slider(
+            "Tree Height Range (ft)",
+            sales.height_range[0],
+            sales.height_range[1],
+            sales.height_range,
+            0.5,
+            key="sales_height_slider_unique"
+        )
+
+        any_pre_2023 = any(yr < 2023 for yr in selected_years)
+        st.sidebar.markdown("(The following filters are only available for years 2023 and beyond)")
+
+        quality_options = sales.qualities
+        selected_quality = quality_options
+        if any_pre_2023:
+            st.sidebar.multiselect("Select Quality (A & B only)", options=quality_options, default=quality_options, disabled=True)
+        else:
+            selected_quality = st.sidebar.multiselect("Select Quality (A & B only)", options=quality_options, default=quality_options)
+
+        customer = sales.customers
+        selected_customer = "All"
+        if any_pre_2023:
+            st.sidebar.selectbox("Select Customer", options=["All"], index=0, disabled=True)
+        else:
+            selected_customer = st.sidebar.selectbox("Select Customer", options=["All"] + list(customer))
+
+        sales_filter = SalesFilter(
+            years=tuple(selected_years),
+            height_range=height_range,
+            qualities=None if any_pre_2023 else tuple(selected_quality),
+            customer=selected_customer,
+        )
+        with timing.span("query"):
+            result = query_sales(sheets, sales_filter)
+        filters = sales_filter.key()
+
+        # The metric only changes which totals and charts are shown, not the query
+        @section("Metric")
+        def sales_metric(result, filters, any_pre_2023, selected_customer):
+            metric_options = ["Tree Count"] if any_pre_2023 else ["Tree Count", "Revenue"]
+            metric = st.sidebar.radio("Select Metric", metric_options, index=0)
+
+            if metric == "Tree Count":
+                st.markdown(f"<h3 style='color:green;'>Total Tree Sales Based on Filter Selections: {result.total('Quantity')}</h3>", unsafe_allow_html=True)
+
+                def height_chart():
+                    grouped = result.by_height("Quantity")
+                    grouped["Sales Year"] = grouped["Sales Year"].astype(str)
+                    fig_year_grouped = px.bar(grouped, x="Tree Height (ft)", y="Quantity", color="Sales Year", labels={"Quantity": "Tree Count"}, title="Tree Sales by Height and Year")
+                    fig_year_grouped.update_layout(barmode="group")
+                    return fig_year_grouped
+
+                def distribution_pie():
+                    if selected_customer == "All":
+                        return px.pie(
+                            result.by_customer("Quantity"),
+                            names="Customer",
+                            values="Quantity",
+                            title="Tree Sales Distribution by Customer"
+                        )
+                    return px.pie(
+                        result.height_totals("Quantity"),
+                        names="Tree Height (ft)",
+                        values="Quantity",
+                        title=f"{selected_customer} - Tree Sales Distribution by Height"
+                    )
+            else:
+                st.markdown(f"<h3 style='color:green;'>Total Revenue Based on Filter Selections: ${result.total('Revenue'):,.2f}</h3>", unsafe_allow_html=True)
+
+                def height_chart():
+                    grouped = result.by_height("Revenue")
+                    grouped["Sales Year"] = grouped["Sales Year"].astype(str)
+                    fig_year_grouped = px.bar(grouped, x="Tree Height (ft)", y="Revenue", color="Sales Year", labels={"Revenue": "Revenue ($)"}, title="Revenue by Height and Year")
+                    fig_year_grouped.update_layout(barmode="group")
+                    fig_year_grouped.update_yaxes(tickprefix="$")
+                    return fig_year_grouped
+
+                def distribution_pie():
+                    if selected_customer == "All":
+                        fig = px.pie(
+                            result.by_customer("Revenue"),
+                            names="Customer",
+                            values="Revenue",
+                            title="Revenue Distribution by Customer"
+                        )
+                    else:
+                        fig = px.pie(
+                            result.height_totals("Revenue"),
+                            names="Tree Height (ft)",
+                            values="Revenue",
+                            title=f"{selected_customer} - Revenue Distribution by Height"
+                        )
+                    fig.update_traces(textinfo='percent+value', texttemplate='%{percent} <br> $%{value:,.0f}')
+                    return fig
+
+            show_chart(f"height {metric}", filters, height_chart)
+            if not any_pre_2023:
+                show_chart(f"pie {metric}", filters, distribution_pie)
+
+        sales_metric(result, filters, any_pre_2023, selected_customer)
+
+    historical_sales_page()
 
-    quality_order = ["A", "B", "Cut"]
-    available_qualities = [q for q in quality_order if q in data["Quality"].unique()]
-    default_selection = [q for q in ["A", "B"] if q in available_qualities]
+elif page == "Planting History":
+    @section(page)
+    def planting_history_page():
+        st.title("Planting History")
 
-    quality_options = st.sidebar.multiselect("Select Quality", options=available_qualities, default=default_selection)
 
-    st.sidebar.markdown("**A** = Good  \n**B** = Needs Pruning")
+        with timing.span("dataset"):
+            planting = planting_dataset(sheets)
 
-    lot_options = ['All'] + sorted(data["Lot"].unique(), key=lambda x: int(str(x)))
-    selected_lot = st.sidebar.selectbox("Select Lot (see Lot Map)", options=lot_options)
+        st.sidebar.header("Planting Filters")
+        year_options = planting.years
+        selected_years = st.sidebar.multiselect("Select Year(s)", options=year_options, default=year_options)
+        min_height, max_height = planting.height_range
+        height_range = st.sidebar.slider("Tree Height Range (in)", min_height, max_height, (min_height, max_height), step=6, key="planting_height_slider_unique")
 
-    if selected_lot == 'All':
-        lots = data["Lot"].unique()
-    else:
-        lots = [selected_lot]
-
-    inventory_years = sorted(data["Inventory Year"].dropna().unique())
-    default_years = inventory_years  # Display all years by default
-    selected_years = st.sidebar.multiselect("Select Inventory Year(s)", options=inventory_years, default=default_years)
-
-    filtered_data = data[(data["Lot"].isin(lots)) & (data["Tree Height (ft)"].between(height_range[0], height_range[1])) & (data["Quality"].isin(quality_options)) & (data["Inventory Year"].isin(selected_years))]
-
-    st.title("Current Tree Inventory")
-    # Display total count by year
-    year_totals = filtered_data.groupby("Inventory Year")["Count"].sum().sort_index()
-    total_text = " | ".join([f"{int(year)}: {count}" for year, count in year_totals.items()])
-    st.markdown(f"<h3 style='color:green;'>Total Tree Count Based on Filter Selections: {total_text}</h3>", unsafe_allow_html=True)
-
-    # Bar chart with year colors
-    height_group = filtered_data.groupby(["Tree Height (ft)", "Inventory Year"])["Count"].sum().reset_index()
-    height_group["Inventory Year"] = height_group["Inventory Year"].astype(str)
-    fig = px.bar(height_group, x='Tree Height (ft)', y='Count', color='Inventory Year')
-    fig.update_layout(barmode="group")
-    st.plotly_chart(fig)
-
-    # Create separate pie charts for each selected year
-    for year in sorted(selected_years):
-        year_data = filtered_data[filtered_data["Inventory Year"] == year]
-        height_bins = pd.cut(year_data["Tree Height (ft)"], bins=[0, 5, 10, 15, 20, float('inf')], labels=["0-5ft", "6-10ft", "11-15ft", "16-20ft", ">20ft"])
-        height_distribution = year_data.groupby(height_bins)["Count"].sum().reset_index()
-        fig = px.pie(height_distribution, names="Tree Height (ft)", values="Count", title=f"Tree Distribution by Height ({int(year)})")
-        st.plotly_chart(fig)
+        lot_options = ["All"] + planting.lots
+        selected_lot = st.sidebar.selectbox("Select Lot", lot_options)
 
-    if selected_lot == 'All':
-        lot_group = filtered_data.groupby(["Lot", "Inventory Year"])["Count"].sum().reset_index()
-        lot_group["Inventory Year"] = lot_group["Inventory Year"].astype(str)
-        fig_lot = px.bar(lot_group, x='Lot', y='Count', color='Inventory Year')
-        fig_lot.update_layout(barmode="group")
-        st.plotly_chart(fig_lot)
-    else:
-        row_group = filtered_data.groupby(["Row", "Inventory Year"])["Count"].sum().reset_index()
-        row_group["Inventory Year"] = row_group["Inventory Year"].astype(str)
-        fig_lot = px.bar(row_group, x='Row', y='Count', color='Inventory Year')
-        fig_lot.update_layout(barmode="group")
-        st.plotly_chart(fig_lot)
+        planting_filter = PlantingFilter(years=tuple(selected_years), lot=selected_lot, height_range=height_range)
+        with timing.span("query"):
+            result = query_planting(sheets, planting_filter)
+        filters = planting_filter.key()
 
-    tree_summary = filtered_data.groupby(["Quality", "Lot", "Row", "Tree Height (ft)"])["Count"].sum().reset_index()
-    tree_summary["Work Completed?"] = ""
-    st.dataframe(tree_summary, hide_index=True)
+        st.markdown(f"<h3 style='color:green;'>Total Tree Planting Count Based on Filter Selections: {result.total()}</h3>", unsafe_allow_html=True)
 
-elif page == "Lot Map":
-    st.title("Lot Map")
-    st.image("map_larger.png")
+        def height_chart():
+            grouped = result.height_by_year()
+            grouped["Year"] = grouped["Year"].astype(str)
+            fig1 = px.bar(grouped, x="Tree Height (in)", y="Count", color="Year", color_discrete_sequence=px.colors.qualitative.Safe, title="Trees Planted by Height and Year", labels={"Count": "Trees Planted"})
+            fig1.update_layout(barmode="group")
+            fig1.update_traces(marker_line_width=0)
+            fig1.update_layout(legend_title_text="Year")
+            return fig1
 
-elif page == "Historical Sales":
-    st.title("Historical Sales")
-
-    st.sidebar.header("Sales Filters")
-    years = sorted(sales_data["Sales Year"].dropna().unique())
-    default_years = years[-2:] if len(years) >= 2 else years
-    selected_years = st.sidebar.multiselect("Select Sales Year(s)", years, default=default_years)
-
-    height_range = st.sidebar.slider(
-        "Tree Height Range (ft)",
-        float(sales_data["Tree Height (ft)"].min()),
-        float(sales_data["Tree Height (ft)"].max()),
-        (float(sales_data["Tree Height (ft)"].min()), float(sales_data["Tree Height (ft)"].max())),
-        0.5,
-        key="sales_height_slider_unique"
-    )
-
-    any_pre_2023 = any(yr < 2023 for yr in selected_years)
-    st.sidebar.markdown("(The following filters are only available for years 2023 and beyond)")
-
-    quality_options = ["A", "B"]
-    selected_quality = quality_options
-    if any_pre_2023:
-        st.sidebar.multiselect("Select Quality (A & B only)", options=quality_options, default=quality_options, disabled=True)
-    else:
-        selected_quality = st.sidebar.multiselect("Select Quality (A & B only)", options=quality_options, default=quality_options)
+        show_chart("height", filters, height_chart)
 
-    customer = sorted(sales_data["Customer"].dropna().unique())
-    selected_customer = "All"
-    if any_pre_2023:
-        st.sidebar.selectbox("Select Customer", options=["All"], index=0, disabled=True)
-    else:
-        selected_customer = st.sidebar.selectbox("Select Customer", options=["All"] + list(customer))
-
-    metric_options = ["Tree Count"] if any_pre_2023 else ["Tree Count", "Revenue"]
-    metric = st.sidebar.radio("Select Metric", metric_options, index=0)
-
-    sales_filtered = sales_data[(sales_data["Sales Year"].isin(selected_years)) & (sales_data["Tree Height (ft)"].between(height_range[0], height_range[1]))]
-    if not any_pre_2023:
-        sales_filtered = sales_filtered[sales_filtered["Quality"].isin(selected_quality)]
-    if selected_customer != "All":
-        sales_filtered = sales_filtered[sales_filtered["Customer"] == selected_customer]
-
-    sales_filtered = sales_filtered.copy()
-    sales_filtered["Revenue"] = sales_filtered["Quantity"] * sales_filtered["Cost Per Tree"]
-
-    if metric == "Tree Count":
-        st.markdown(f"<h3 style='color:green;'>Total Tree Sales Based on Filter Selections: {sales_filtered['Quantity'].sum()}</h3>", unsafe_allow_html=True)
-        
-        grouped = sales_filtered.groupby(["Tree Height (ft)", "Sales Year"])["Quantity"].sum().reset_index()
-        grouped["Sales Year"] = grouped["Sales Year"].astype(str)
-        fig_year_grouped = px.bar(grouped, x="Tree Height (ft)", y="Quantity", color="Sales Year", labels={"Quantity": "Tree Count"}, title="Tree Sales by Height and Year")
-        fig_year_grouped.update_layout(barmode="group")
-        st.plotly_chart(fig_year_grouped)
-
-        if not any_pre_2023:
-            if selected_customer == "All":
-                fig = px.pie(
-                    sales_filtered.groupby("Customer")["Quantity"].sum().reset_index(),
-                    names="Customer",
-                    values="Quantity",
-                    title="Tree Sales Distribution by Customer"
-                )
-            else:
-                fig = px.pie(
-                    sales_filtered.groupby("Tree Height (ft)")["Quantity"].sum().reset_index(),
-                    names="Tree Height (ft)",
-                    values="Quantity",
-                    title=f"{selected_customer} - Tree Sales Distribution by Height"
-                )
-            st.plotly_chart(fig)
-    else:
-        st.markdown(f"<h3 style='color:green;'>Total Revenue Based on Filter Selections: ${sales_filtered['Revenue'].sum():,.2f}</h3>", unsafe_allow_html=True)
-        
-        grouped = sales_filtered.groupby(["Tree Height (ft)", "Sales Year"])["Revenue"].sum().reset_index()
-        grouped["Sales Year"] = grouped["Sales Year"].astype(str)
-        fig_year_grouped = px.bar(grouped, x="Tree Height (ft)", y="Revenue", color="Sales Year", labels={"Revenue": "Revenue ($)"}, title="Revenue by Height and Year")
-        fig_year_grouped.update_layout(barmode="group")
-        fig_year_grouped.update_yaxes(tickprefix="$")
-        st.plotly_chart(fig_year_grouped)
-
-        if not any_pre_2023:
-            if selected_customer == "All":
-                fig = px.pie(
-                    sales_filtered.groupby("Customer")["Revenue"].sum().reset_index(),
-                    names="Customer",
-                    values="Revenue",
-                    title="Revenue Distribution by Customer"
-                )
+        def height_pie():
+            pie_data = result.height_totals()
+            return px.pie(pie_data, names="Tree Height (in)", values="Count", title="Distribution of Trees by Height (in)")
+
+        show_chart("pie", filters, height_pie)
+
+        def lot_chart():
+            if selected_lot == "All":
+                lot_group = result.lot_by_year()
+                lot_group["Year"] = lot_group["Year"].astype(str)
+                fig3 = px.bar(lot_group, x="Lot #", y="Count", color="Year", title="Trees Planted by Lot", labels={"Count": "Trees Planted"})
+                fig3.update_layout(barmode="group")
             else:
-                fig = px.pie(
-                    sales_filtered.groupby("Tree Height (ft)")["Revenue"].sum().reset_index(),
-                    names="Tree Height (ft)",
-                    values="Revenue",
-                    title=f"{selected_customer} - Revenue Distribution by Height"
+                row_group = result.row_totals()
+                fig3 = px.bar(row_group, x="Row #", y="Count", title=f"Trees Planted by Row in Lot {selected_lot}", labels={"Count": "Trees Planted"})
+            return fig3
+
+        show_chart("lot", filters, lot_chart)
+
+    planting_history_page()
+
+elif page == "Projected Inventory":
+    @section(page)
+    def projected_inventory_page():
+        with timing.span("dataset"):
+            inventory = inventory_dataset(sheets)
+        st.title("Projected Tree Inventory")
+
+        st.sidebar.header("Projection Settings")
+        start_year = st.sidebar.selectbox("Starting Inventory Year", inventory.years, index=len(inventory.years) - 1)
+        default_selection = [q for q in ["A", "B"] if q in inventory.qualities]
+        quality_options = st.sidebar.multiselect("Select Quality", options=inventory.qualities, default=default_selection, key="projection_quality_unique")
+        horizon = st.sidebar.slider("Years to Project", 1, 15, 5, key="projection_years_slider_unique")
+        growth_ft = st.sidebar.slider("Average Growth per Year (ft)", 0.0, 3.0, 1.0, 0.1)
+        growth_spread_ft = st.sidebar.slider("Growth Variation (ft)", 0.0, 1.5, 0.5, 0.1)
+        mortality = st.sidebar.slider("Trees Lost per Year (%)", 0.0, 20.0, 2.0, 0.5)
+        purchase_height = st.sidebar.slider("Height of Purchased Trees (ft)", 0.5, 5.0, 1.0, 0.5)
+
+        purchases = st.number_input("How many new trees do you want to buy each year?", min_value=0, value=0, step=50)
+
+        st.write("### Planned Sales per Year")
+        columns = st.columns(len(HEIGHT_BIN_LABELS))
+        planned_sales = [
+            column.number_input(f"{label} Trees", min_value=0, max_value=100000, value=0, step=10, key=f"projection_sales_{label}")
+            for column, label in zip(columns, HEIGHT_BIN_LABELS)
+        ]
+
+        projection_filter = ProjectionFilter(
+            year=start_year,
+            qualities=tuple(quality_options),
+            horizon=horizon,
+            growth_ft=growth_ft,
+            growth_spread_ft=growth_spread_ft,
+            mortality=mortality / 100,
+            purchases=int(purchases),
+            purchase_height=purchase_height,
+            sales=tuple(planned_sales),
+        )
+        with timing.span("query"):
+            projection = query_projection(sheets, projection_filter)
+        filters = projection_filter.key()
+
+        projection_summary = projection.summary()
+        final_year, final_count = projection_summary.iloc[-1][["Year", "Trees"]]
+        st.markdown(f"<h3 style='color:green;'>Projected Tree Count in {int(final_year)}: {int(final_count)}</h3>", unsafe_allow_html=True)
+
+        def band_chart():
+            band_group = projection.by_band()
+            band_group["Year"] = band_group["Year"].astype(str)
+            fig = px.bar(band_group, x="Year", y="Count", color="Height", title="Projected Trees by Height Range", labels={"Count": "Number of Trees"})
+            return fig
+
+        show_chart("bands", filters, band_chart)
+
+        def final_chart():
+            return px.bar(projection.by_height(), x="Tree Height (ft)", y="Count", title=f"Projected Tree Inventory ({int(final_year)})", labels={"Count": "Number of Trees"})
+
+        show_chart("final", filters, final_chart)
+
+        st.dataframe(projection_summary, hide_index=True)
+
+        # Trials and demand only rerun the simulation, not the projection above
+        @section("Scenario Risk")
+        def scenario_risk(plan, filters, final_year):
+            st.write("### Scenario Risk")
+            if st.checkbox("Simulate growth, losses and demand from past inventory and sales years", key="projection_scenarios_unique"):
+                trials = st.select_slider("Number of Trials", options=[500, 1000, 2000, 5000, 10000], value=2000)
+                demand_scale = st.slider("Demand Compared to Past Years (%)", 50, 200, 100, 10)
+                scenario_plan = dataclasses.replace(plan, demand_scale=demand_scale / 100)
+                with timing.span("scenarios"):
+                    scenarios = run_scenarios(sheets, scenario_plan, trials=trials)
+                history = scenarios.history
+                st.markdown(
+                    f"Past years: growth {history.growth_ft:.1f} ± {history.growth_sd_ft:.1f} ft/year, "
+                    f"{history.mortality:.0%} ± {history.mortality_sd:.0%} of trees lost per year, "
+                    f"sales drawn from {len(history.demand)} sales years"
                 )
-            fig.update_traces(textinfo='percent+value', texttemplate='%{percent} <br> $%{value:,.0f}')
-            st.plotly_chart(fig)
 
-elif page == "Planting History":
-    if "data" not in st.session_state:
-        st.warning("Please enter the password on the home page to unlock the data.")
-        st.stop()
-    sheets = st.session_state["data"]
-    st.title("Planting History")
-    
-
-    planting_data = sheets["Planting"].copy()
-    planting_data["Date"] = pd.to_datetime(planting_data["Date"])
-    planting_data["Year"] = planting_data["Date"].dt.year
-
-    id_columns = ["Date", "Year", "Lot #", "Row #"]
-    height_columns = [col for col in planting_data.columns if col not in id_columns and str(col).strip().isdigit()]
-
-    long_df = planting_data.melt(
-        id_vars=id_columns,
-        value_vars=height_columns,
-        var_name="Tree Height (in)",
-        value_name="Count"
-    )
-
-    long_df["Tree Height (in)"] = pd.to_numeric(long_df["Tree Height (in)"], errors="coerce")
-    long_df = long_df.dropna(subset=["Tree Height (in)", "Count"])
-    long_df["Count"] = long_df["Count"].astype(int)
-
-    st.sidebar.header("Planting Filters")
-    year_options = sorted(long_df["Year"].dropna().unique())
-    selected_years = st.sidebar.multiselect("Select Year(s)", options=year_options, default=year_options)
-    min_height_val = long_df["Tree Height (in)"].dropna().min()
-    min_height = int(min_height_val) if pd.notnull(min_height_val) else 0
-    max_height_val = long_df["Tree Height (in)"].dropna().max()
-    max_height = int(max_height_val) if pd.notnull(max_height_val) else 100
-    height_range = st.sidebar.slider("Tree Height Range (in)", min_height, max_height, (min_height, max_height), step=6, key="planting_height_slider_unique")
-
-    lot_options = ["All"] + sorted(long_df["Lot #"].dropna().unique(), key=lambda x: int(str(x)))
-    selected_lot = st.sidebar.selectbox("Select Lot", lot_options)
-
-    filtered = long_df[long_df["Tree Height (in)"].between(height_range[0], height_range[1]) & long_df["Year"].isin(selected_years)]
-    if selected_lot != "All":
-        filtered = filtered[filtered["Lot #"] == selected_lot]
-
-    st.markdown(f"<h3 style='color:green;'>Total Tree Planting Count Based on Filter Selections: {filtered['Count'].sum()}</h3>", unsafe_allow_html=True)
-
-    grouped = filtered.groupby(["Tree Height (in)", "Year"])["Count"].sum().reset_index()
-    grouped["Year"] = grouped["Year"].astype(str)
-    fig1 = px.bar(grouped, x="Tree Height (in)", y="Count", color="Year", color_discrete_sequence=px.colors.qualitative.Safe, title="Trees Planted by Height and Year", labels={"Count": "Trees Planted"})
-    fig1.update_layout(barmode="group")
-    fig1.update_traces(marker_line_width=0)
-    fig1.update_layout(legend_title_text="Year")
-    st.plotly_chart(fig1)
-
-    pie_data = filtered.groupby("Tree Height (in)")["Count"].sum().reset_index()
-    fig2 = px.pie(pie_data, names="Tree Height (in)", values="Count", title="Distribution of Trees by Height (in)")
-    st.plotly_chart(fig2)
-
-    if selected_lot == "All":
-        lot_group = filtered.groupby(["Lot #", "Year"])["Count"].sum().reset_index()
-        lot_group["Year"] = lot_group["Year"].astype(str)
-        fig3 = px.bar(lot_group, x="Lot #", y="Count", color="Year", title="Trees Planted by Lot", labels={"Count": "Trees Planted"})
-        fig3.update_layout(barmode="group")
-    else:
-        row_group = filtered.groupby("Row #")["Count"].sum().reset_index()
-        fig3 = px.bar(row_group, x="Row #", y="Count", title=f"Trees Planted by Row in Lot {selected_lot}", labels={"Count": "Trees Planted"})
-    st.plotly_chart(fig3)
\ No newline at end of file
+                def scenario_chart():
+                    bands = scenarios.totals().melt(id_vars="Year", var_name="Percentile", value_name="Count")
+                    bands["Year"] = bands["Year"].astype(str)
+                    return px.line(bands, x="Year", y="Count", color="Percentile", markers=True, title=f"Projected Tree Count over {trials} Trials", labels={"Count": "Number of Trees"})
+
+                show_chart(f"scenarios {trials} {demand_scale}", filters, scenario_chart)
+
+                st.write(f"#### Projected Trees by Height Range in {int(final_year)}")
+                st.dataframe(scenarios.bands(), hide_index=True)
+
+        scenario_risk(
+            ScenarioPlan(
+                year=start_year,
+                qualities=tuple(quality_options),
+                horizon=horizon,
+                purchases=int(purchases),
+                purchase_height=purchase_height,
+                growth_spread_ft=growth_spread_ft,
+            ),
+            filters,
+            final_year,
+        )
+
+    projected_inventory_page()
+
+elif page == "Harvest Planning":
+    @section(page)
+    def harvest_planning_page():
+        with timing.span("dataset"):
+            inventory = inventory_dataset(sheets)
+            sales = sales_dataset(sheets)
+        st.title("Harvest Planning")
+
+        st.sidebar.header("Planning Settings")
+        stock_year = st.sidebar.selectbox("Dig from Inventory Year", inventory.years, index=len(inventory.years) - 1, key="planning_year_unique")
+        # Only sales from 2023 on record the customer and quality of each order
+        order_years = [year for year in sales.years if year >= 2023]
+        seed_year = st.sidebar.selectbox("Start from Orders of Sales Year", order_years, index=max(len(order_years) - 1, 0))
+        tolerance = st.sidebar.slider("Default Height Tolerance (± ft)", 0.0, 3.0, 0.5, 0.5, key="planning_tolerance_unique")
+
+        st.write("### Order Book")
+        st.caption("Edit, add or remove orders; each is filled with trees of its quality within its height tolerance.")
+        order_book = st.data_editor(
+            orders_frame(sales_orders(sales.frame, seed_year, tolerance)),
+            num_rows="dynamic",
+            hide_index=True,
+            key=f"planning_orders_{seed_year}",
+            column_config={
+                "Trees": st.column_config.NumberColumn(min_value=0, step=1),
+                "Quality": st.column_config.SelectboxColumn(options=inventory.qualities),
+                "Tree Height (ft)": st.column_config.NumberColumn(min_value=0.0, step=0.5),
+                "Tolerance (ft)": st.column_config.NumberColumn(min_value=0.0, step=0.5, default=tolerance),
+            },
+        )
+        orders = frame_orders(order_book)
+        if not orders:
+            st.info("Add an order to plan a harvest.")
+            return
+
+        with timing.span("allocate"):
+            allocation = allocate_orders(sheets, orders, stock_year)
+        filters = normalize_filters(year=stock_year, orders=tuple(orders))
+
+        st.markdown(
+            f"<h3 style='color:green;'>Allocated {allocation.total()} of {allocation.total('Ordered')} Trees "
+            f"from {allocation.rows_visited()} Rows in {allocation.lots_visited()} Lots</h3>",
+            unsafe_allow_html=True,
+        )
+        short = allocation.orders[allocation.orders["Short"] > 0]
+        if len(short):
+            st.warning(f"{len(short)} of {len(orders)} orders cannot be filled from the {stock_year} inventory within their height tolerance.")
+
+        def lot_chart():
+            return px.bar(allocation.by_lot(), x="Lot", y="Trees", color="Customer", title="Trees to Dig by Lot")
+
+        show_chart("lots", filters, lot_chart)
+
+        st.write("### Orders")
+        st.dataframe(allocation.orders, hide_index=True)
+        st.write("### Pick List")
+        st.dataframe(allocation.pick_list(), hide_index=True)
+
+    harvest_planning_page()
+
+# Opt-in performance panel: this rerun's spans and the rolling p50/p95 for the page
+if rerun is not None:
+    timing.end(rerun)
+    with st.sidebar.expander("Performance"):
+        st.markdown(f"**This rerun:** {rerun.total_ms:.0f} ms")
+        st.dataframe(
+            [{"span": "\u00a0\u00a0" * span["depth"] + span["name"], "ms": round(span["ms"], 1)} for span in rerun.to_dict()["spans"]],
+            hide_index=True,
+        )
+        st.markdown(f"**{page}, last {timing.timing_stats.window} reruns**")
+        st.dataframe(timing.timing_stats.summary(page), hide_index=True)
@@ -0,0 +1,125 @@
+"""Data layer for the Spruce Point Tree Farm app.
+
+Everything in this package is plain pandas/NumPy and can be imported without
+Streamlit; ``sptf.py`` is the UI on top of it.
+"""
+
+from sptf_core.allocation import Allocation, Order, StockIndex, allocate_orders, stock_index
+from sptf_core.crypto import KeyCache, decrypt_workbook, key_cache, unlock_workbook
+from sptf_core.cube import InventoryCube, height_bin_totals, inventory_cube, rollup
+from sptf_core.deltas import InventoryDeltas, inventory_deltas
+from sptf_core.figures import FigureCache, figure_cache, normalize_filters
+from sptf_core.index import FilterIndex
+from sptf_core.planting import PlantingData, melt_planting, planting_dataset
+from sptf_core.projection import GrowthModel, Projection, project
+from sptf_core.query import (
+    InventoryFilter,
+    InventoryResult,
+    PlantingFilter,
+    PlantingResult,
+    ProjectionFilter,
+    SalesFilter,
+    SalesResult,
+    query_inventory,
+    query_planting,
+    query_projection,
+    query_sales,
+)
+from sptf_core.sales import UNKNOWN, SalesCube, sales_cube
+from sptf_core.scenarios import ScenarioCache, ScenarioPlan, ScenarioResult, run_scenarios, scenario_cache
+from sptf_core.schema import (
+    INVENTORY_COLUMNS,
+    QUALITY_ORDER,
+    SALES_COLUMNS,
+    InventoryData,
+    SalesData,
+    inventory_dataset,
+    sales_dataset,
+)
+from sptf_core.timing import Rerun, TimingStats, timing_stats
+from sptf_core.unlock import UnlockJob, start_unlock
+from sptf_core.workbook import (
+    WORKBOOK_PATH,
+    LazyWorkbook,
+    SharedWorkbook,
+    WorkbookCache,
+    WorkbookHandle,
+    WorkbookWatcher,
+    file_identity,
+    load_workbook,
+    workbook_cache,
+    workbook_watcher,
+)
+from sptf_core.worklist import ExportJob, SummaryTable, start_export
+
+__all__ = [
+    "Allocation",
+    "INVENTORY_COLUMNS",
+    "ExportJob",
+    "FigureCache",
+    "FilterIndex",
+    "GrowthModel",
+    "InventoryCube",
+    "InventoryData",
+    "InventoryDeltas",
+    "InventoryFilter",
+    "InventoryResult",
+    "KeyCache",
+    "LazyWorkbook",
+    "Order",
+    "PlantingData",
+    "PlantingFilter",
+    "PlantingResult",
+    "Projection",
+    "ProjectionFilter",
+    "QUALITY_ORDER",
+    "Rerun",
+    "SALES_COLUMNS",
+    "SalesCube",
+    "SalesData",
+    "SalesFilter",
+    "SalesResult",
+    "ScenarioCache",
+    "ScenarioPlan",
+    "ScenarioResult",
+    "SharedWorkbook",
+    "StockIndex",
+    "SummaryTable",
+    "TimingStats",
+    "UNKNOWN",
+    "UnlockJob",
+    "WORKBOOK_PATH",
+    "WorkbookCache",
+    "WorkbookHandle",
+    "WorkbookWatcher",
+    "allocate_orders",
+    "decrypt_workbook",
+    "figure_cache",
+    "file_identity",
+    "height_bin_totals",
+    "inventory_cube",
+    "inventory_dataset",
+    "inventory_deltas",
+    "key_cache",
+    "load_workbook",
+    "melt_planting",
+    "normalize_filters",
+    "planting_dataset",
+    "project",
+    "query_inventory",
+    "query_planting",
+    "query_projection",
+    "query_sales",
+    "rollup",
+    "run_scenarios",
+    "sales_dataset",
+    "sales_cube",
+    "scenario_cache",
+    "start_export",
+    "start_unlock",
+    "stock_index",
+    "timing_stats",
+    "unlock_workbook",
+    "workbook_cache",
+    "workbook_watcher",
+]
@@ -0,0 +1,197 @@
+"""Allocating customer orders to lots and rows for harvest.
+
+``stock_index(workbook)`` sorts the inventory cube once per workbook by
+(Inventory Year, Quality, Tree Height (ft), Lot, Row), so the stock that can
+fill an order - one quality, heights within a tolerance - is a contiguous
+slice found with two binary searches.
+
+``allocate_orders(workbook, orders, year)`` fills a whole order book in one
+pass. Orders with the least spare stock go first, so a flexible order does
+not take trees that a tight one needs. Each order takes trees from rows the
+crew already visits, then from rows in lots already visited, then from the
+row with the most matching trees, so as few rows as possible are opened.
+Within a row the heights closest to the order are taken first.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from sptf_core.cube import inventory_cube, rollup
+
+ORDER_COLUMNS = ["Customer", "Trees", "Quality", "Tree Height (ft)", "Tolerance (ft)"]
+
+
+@dataclass(frozen=True)
+class Order:
+    customer: str
+    trees: int
+    quality: str
+    height: float
+    tolerance: float = 0.5
+
+
+@dataclass(frozen=True)
+class StockIndex:
+    lots: list
+    blocks: dict
+    height: np.ndarray
+    lot: np.ndarray
+    row: np.ndarray
+    row_id: np.ndarray
+    count: np.ndarray
+
+    def window(self, year, quality, low, high):
+        """``(start, stop)`` of the ``year`` stock of ``quality`` with heights in ``[low, high]``."""
+        start, stop = self.blocks.get((year, quality), (0, 0))
+        heights = self.height[start:stop]
+        return start + int(np.searchsorted(heights, low, "left")), start + int(np.searchsorted(heights, high, "right"))
+
+
+def build_stock_index(cells):
+    cells = cells[cells["Count"] > 0]
+    year = cells["Inventory Year"].to_numpy()
+    quality = cells["Quality"].cat.codes.to_numpy()
+    height = cells["Tree Height (ft)"].to_numpy(dtype=float)
+    lot = cells["Lot"].cat.codes.to_numpy()
+    row = cells["Row"].to_numpy()
+    order = np.lexsort((row, lot, height, quality, year))
+    year, quality, height, lot, row = year[order], quality[order], height[order], lot[order], row[order]
+
+    qualities = list(cells["Quality"].cat.categories)
+    starts = np.flatnonzero(np.r_[True, (np.diff(year) != 0) | (np.diff(quality) != 0)]) if len(order) else np.array([], dtype=int)
+    stops = np.r_[starts[1:], len(order)]
+    blocks = {(int(year[start]), qualities[quality[start]]): (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+    _, row_id = np.unique(lot.astype(np.int64) * (int(row.max(initial=0)) + 1) + row, return_inverse=True)
+    return StockIndex(
+        lots=list(cells["Lot"].cat.categories),
+        blocks=blocks,
+        height=height,
+        lot=lot,
+        row=row,
+        row_id=row_id.ravel(),
+        count=cells["Count"].to_numpy(dtype=np.int64)[order],
+    )
+
+
+def stock_index(workbook):
+    """Sorted stock of ``workbook``'s inventory, built once per workbook."""
+    return workbook.derive("stock_index", lambda wb: build_stock_index(inventory_cube(wb).cells))
+
+
+@dataclass(frozen=True)
+class Allocation:
+    orders: pd.DataFrame
+    picks: pd.DataFrame
+
+    def total(self, column="Allocated"):
+        return int(self.orders[column].sum())
+
+    def rows_visited(self):
+        return len(self.picks[["Lot", "Row"]].drop_duplicates())
+
+    def lots_visited(self):
+        return self.picks["Lot"].nunique()
+
+    def by_lot(self):
+        return rollup(self.picks, ["Lot", "Customer"], "Trees")
+
+    def pick_list(self):
+        """Trees to dig per row, in the order the crew walks the lots."""
+        return self.picks.sort_values(["Lot", "Row", "Tree Height (ft)", "Order"], kind="stable", ignore_index=True)
+
+
+def allocate(index, orders, year):
+    """Assign ``orders`` to the ``year`` stock in ``index``; stock is not changed."""
+    remaining = index.count.copy()
+    row_opened = np.zeros(int(index.row_id.max(initial=-1)) + 1, dtype=bool)
+    lot_opened = np.zeros(len(index.lots), dtype=bool)
+    windows = [index.window(year, order.quality, order.height - order.tolerance, order.height + order.tolerance) for order in orders]
+    spare = [int(remaining[start:stop].sum()) - order.trees for order, (start, stop) in zip(orders, windows)]
+
+    allocated = np.zeros(len(orders), dtype=np.int64)
+    rows_used = np.zeros(len(orders), dtype=np.int64)
+    pick_order, pick_cell, pick_trees = [], [], []
+    for number in sorted(range(len(orders)), key=lambda i: (spare[i], i)):
+        order = orders[number]
+        start, stop = windows[number]
+        cells = np.arange(start, stop)
+        cells = cells[remaining[cells] > 0]
+        if order.trees <= 0 or not len(cells):
+            continue
+        ids, row_of_cell = np.unique(index.row_id[cells], return_inverse=True)
+        available = np.bincount(row_of_cell, weights=remaining[cells])
+        lot_of_row = np.empty(len(ids), dtype=index.lot.dtype)
+        lot_of_row[row_of_cell] = index.lot[cells]
+        # Rows already visited, then rows in lots already visited, then the fullest rows
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[np.lexsort((-available, ~lot_opened[lot_of_row], ~row_opened[ids]))] = np.arange(len(ids))
+        cells = cells[np.lexsort((np.abs(index.height[cells] - order.height), rank[row_of_cell]))]
+
+        stock = remaining[cells]
+        taken = np.minimum(stock, np.clip(order.trees - (np.cumsum(stock) - stock), 0, None))
+        used = taken > 0
+        cells, taken = cells[used], taken[used]
+        remaining[cells] -= taken
+        row_opened[index.row_id[cells]] = True
+        lot_opened[index.lot[cells]] = True
+        allocated[number] = taken.sum()
+        rows_used[number] = len(np.unique(index.row_id[cells]))
+        pick_order.append(np.full(len(cells), number))
+        pick_cell.append(cells)
+        pick_trees.append(taken)
+
+    ordered = np.array([order.trees for order in orders], dtype=np.int64)
+    summary = pd.DataFrame(
+        {
+            "Order": np.arange(1, len(orders) + 1),
+            "Customer": [order.customer for order in orders],
+            "Quality": [order.quality for order in orders],
+            "Tree Height (ft)": [order.height for order in orders],
+            "Tolerance (ft)": [order.tolerance for order in orders],
+            "Ordered": ordered,
+            "Allocated": allocated,
+            "Short": ordered - allocated,
+            "Rows": rows_used,
+        }
+    )
+
+    numbers = np.concatenate(pick_order) if pick_order else np.array([], dtype=int)
+    cells = np.concatenate(pick_cell) if pick_cell else np.array([], dtype=int)
+    picks = pd.DataFrame(
+        {
+            "Lot": pd.Categorical.from_codes(index.lot[cells], categories=index.lots, ordered=True),
+            "Row": index.row[cells],
+            "Tree Height (ft)": index.height[cells],
+            "Order": numbers + 1,
+            "Customer": [orders[number].customer for number in numbers],
+            "Quality": [orders[number].quality for number in numbers],
+            "Trees": np.concatenate(pick_trees) if pick_trees else np.array([], dtype=np.int64),
+        }
+    )
+    return Allocation(orders=summary, picks=picks)
+
+
+def allocate_orders(workbook, orders, year):
+    """Allocate the order book ``orders`` (a sequence of ``Order``) to ``workbook``'s ``year`` inventory."""
+    return allocate(stock_index(workbook), list(orders), year)
+
+
+def sales_orders(sales, year, tolerance=0.5):
+    """The ``year`` sales from the Sales sheet as an order book, one order per customer, quality and height."""
+    rows = sales[sales["Sales Year"] == year].dropna(subset=["Customer", "Quality"])
+    grouped = rollup(rows, ["Customer", "Quality", "Tree Height (ft)"], "Quantity")
+    return [Order(str(customer), int(trees), str(quality), float(height), tolerance) for customer, quality, height, trees in grouped.itertuples(index=False, name=None)]
+
+
+def orders_frame(orders):
+    """An order book as a frame with ``ORDER_COLUMNS``, for editing."""
+    return pd.DataFrame([(o.customer, o.trees, o.quality, o.height, o.tolerance) for o in orders], columns=ORDER_COLUMNS)
+
+
+def frame_orders(frame):
+    """The orders in an edited ``ORDER_COLUMNS`` frame; rows with a missing value are skipped."""
+    frame = frame[ORDER_COLUMNS].dropna()
+    return [Order(str(customer), int(trees), str(quality), float(height), float(tolerance)) for customer, trees, quality, height, tolerance in frame.itertuples(index=False, name=None)]
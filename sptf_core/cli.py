@@ -0,0 +1,86 @@
+"""Print the page totals for a set of filters as JSON, without starting Streamlit.
+
+    python -m sptf_core [inventory|sales|planting ...] [--lot 3] [--years 2024 2025] ...
+
+The workbook password is read from ``SPTF_PASSWORD`` or prompted for.
+"""
+
+import argparse
+import getpass
+import json
+import os
+import sys
+
+from sptf_core.query import (
+    InventoryFilter,
+    PlantingFilter,
+    SalesFilter,
+    query_inventory,
+    query_planting,
+    query_sales,
+)
+from sptf_core.workbook import WORKBOOK_PATH, LazyWorkbook
+
+PAGES = ("inventory", "sales", "planting")
+
+
+def _value(text):
+    """Lots and years are numbers in the workbook; anything else stays a string."""
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def _height_range(low, high):
+    if low is None and high is None:
+        return None
+    return (float("-inf") if low is None else low, float("inf") if high is None else high)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m sptf_core", description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", metavar="page", help=f"one or more of {', '.join(PAGES)} (default: all)")
+    parser.add_argument("--path", default=WORKBOOK_PATH, help="workbook to read")
+    parser.add_argument("--lot", type=_value, default="All", help="inventory/planting lot (default: All)")
+    parser.add_argument("--years", type=_value, nargs="+", help="inventory/sales/planting years")
+    parser.add_argument("--quality", nargs="+", help="inventory/sales qualities")
+    parser.add_argument("--customer", default="All", help="sales customer (default: All)")
+    parser.add_argument("--min-height", type=float, help="minimum height (ft for inventory/sales, in for planting)")
+    parser.add_argument("--max-height", type=float, help="maximum height (ft for inventory/sales, in for planting)")
+    return parser
+
+
+def run(workbook, args):
+    height_range = _height_range(args.min_height, args.max_height)
+    qualities = tuple(args.quality) if args.quality else None
+    years = tuple(args.years) if args.years else None
+    report = {}
+    if "inventory" in args.pages:
+        flt = InventoryFilter(lot=args.lot, height_range=height_range, qualities=qualities, years=years)
+        report["inventory"] = query_inventory(workbook, flt).to_dict()
+    if "sales" in args.pages:
+        flt = SalesFilter(years=years, height_range=height_range, qualities=qualities, customer=args.customer)
+        report["sales"] = query_sales(workbook, flt).to_dict()
+    if "planting" in args.pages:
+        flt = PlantingFilter(years=years, lot=args.lot, height_range=height_range)
+        report["planting"] = query_planting(workbook, flt).to_dict()
+    return report
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.pages) - set(PAGES))
+    if unknown:
+        parser.error(f"unknown page(s): {', '.join(unknown)}")
+    args.pages = args.pages or list(PAGES)
+    password = os.environ.get("SPTF_PASSWORD") or getpass.getpass("Excel File Password: ")
+    try:
+        workbook = LazyWorkbook(args.path, password)
+    except Exception as exc:
+        print(f"Could not open {args.path}: {exc}", file=sys.stderr)
+        return 1
+    json.dump(run(workbook, args), sys.stdout, indent=2)
+    print()
+    return 0
@@ -0,0 +1,158 @@
+"""Workbook decryption with an in-memory cache of derived keys.
+
+For Agile-encrypted files ``OfficeFile.load_key(password)`` runs a 100k-round
+SHA-512 spin before anything can be decrypted, which dominates the time spent
+on the password screen. ``KeyCache`` runs that derivation once per process and
+hands the derived secret key straight to ``load_key(secret_key=...)`` on every
+later unlock of the same file. Keys never leave memory.
+"""
+
+import hashlib
+import hmac
+import io
+import secrets
+import threading
+from collections import OrderedDict
+
+import msoffcrypto
+from msoffcrypto.method.ecma376_agile import ECMA376Agile
+from msoffcrypto.method.ecma376_standard import ECMA376Standard
+
+_SALT = secrets.token_bytes(16)
+
+
+def password_digest(password):
+    """HMAC of ``password`` under a per-process random salt, for use as a cache key."""
+    return hmac.new(_SALT, password.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def workbook_key_params(office_file):
+    """Everything the derived key depends on besides the password, or None if unsupported."""
+    info = office_file.info
+    if office_file.type == "agile":
+        return (
+            "agile",
+            info["passwordSalt"],
+            info["passwordHashAlgorithm"],
+            info["encryptedKeyValue"],
+            info["spinValue"],
+            info["passwordKeyBits"],
+        )
+    if office_file.type == "standard":
+        header, verifier = info["header"], info["verifier"]
+        return (
+            "standard",
+            header["algId"],
+            header["algIdHash"],
+            header["providerType"],
+            header["keySize"],
+            verifier["saltSize"],
+            verifier["salt"],
+        )
+    return None
+
+
+def derive_key(password, params):
+    """Run the password key derivation for ``params`` (the slow part of an unlock)."""
+    if params[0] == "agile":
+        return ECMA376Agile.makekey_from_password(password, *params[1:])
+    return ECMA376Standard.makekey_from_password(password, *params[1:])
+
+
+class KeyCache:
+    """Bounded LRU of derived secret keys keyed by salted password digest and key parameters.
+
+    A key is only remembered after it has successfully decrypted a file, so a
+    wrong password never poisons the cache.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()
+
+    def get(self, cache_key):
+        with self._lock:
+            key = self._keys.get(cache_key)
+            if key is not None:
+                self._keys.move_to_end(cache_key)
+            return key
+
+    def put(self, cache_key, secret_key):
+        with self._lock:
+            self._keys[cache_key] = secret_key
+            self._keys.move_to_end(cache_key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+
+key_cache = KeyCache()
+
+
+def unlock_workbook(file, password, keys=key_cache):
+    """Decrypt the open workbook ``file``; returns ``(BytesIO, secret key)`` or None if it is not encrypted.
+
+    Raises the ``msoffcrypto`` exception on a wrong password.
+    """
+    office_file = msoffcrypto.OfficeFile(file)
+    if not office_file.is_encrypted():
+        return None
+
+    params = workbook_key_params(office_file) if keys is not None else None
+    if params is None:
+        office_file.load_key(password)
+        cache_key = None
+    else:
+        cache_key = (password_digest(password), params)
+        secret_key = keys.get(cache_key)
+        if secret_key is None:
+            secret_key = derive_key(password, params)
+        office_file.load_key(secret_key=secret_key)
+
+    decrypted = io.BytesIO()
+    office_file.decrypt(decrypted)
+    if cache_key is not None:
+        keys.put(cache_key, office_file.secret_key)
+    decrypted.seek(0)
+    return decrypted, office_file.secret_key
+
+
+def key_check(secret_key, message):
+    """HMAC of ``message`` under a workbook's secret key, which proves the key without revealing it."""
+    return hmac.new(secret_key, message, hashlib.sha256).hexdigest()
+
+
+def check_password(file, password, check, message, keys=key_cache):
+    """Whether ``password`` gives the secret key behind ``check = key_check(key, message)``.
+
+    Only the key derivation runs; nothing is decrypted. Returns None if
+    ``file`` is not encrypted or its encryption is not supported here.
+    """
+    office_file = msoffcrypto.OfficeFile(file)
+    if not office_file.is_encrypted():
+        return None
+    params = workbook_key_params(office_file)
+    if params is None:
+        return None
+    cache_key = (password_digest(password), params)
+    secret_key = keys.get(cache_key)
+    if secret_key is None:
+        secret_key = derive_key(password, params)
+    if not hmac.compare_digest(key_check(secret_key, message), check):
+        return False
+    keys.put(cache_key, secret_key)
+    return True
+
+
+def decrypt_workbook(file, password, keys=key_cache):
+    """Decrypt the open workbook ``file`` into a BytesIO, or return None if it is not encrypted."""
+    unlocked = unlock_workbook(file, password, keys=keys)
+    return None if unlocked is None else unlocked[0]
@@ -0,0 +1,54 @@
+"""Pre-aggregated inventory cube.
+
+The Inventory sheet holds one row per count taken in the field. Every chart on
+the Current Inventory page only needs Count summed over some of (Lot, Row,
+Quality, Tree Height (ft), Inventory Year), so those rows are collapsed once
+per workbook into one cell per distinct key, with the pie-chart height bin
+attached. Filters and rollups then run over the cells, whose number depends on
+how many distinct combinations exist rather than how many rows were entered.
+"""
+
+from dataclasses import dataclass
+
+import pandas as pd
+
+from sptf_core.index import FilterIndex
+from sptf_core.schema import inventory_dataset
+
+CUBE_DIMENSIONS = ["Lot", "Row", "Quality", "Tree Height (ft)", "Inventory Year"]
+HEIGHT_BINS = [0, 5, 10, 15, 20, float("inf")]
+HEIGHT_BIN_LABELS = ["0-5ft", "6-10ft", "11-15ft", "16-20ft", ">20ft"]
+
+
+def rollup(cells, by, value="Count"):
+    """Sum ``value`` over ``by`` and return it as a flat frame."""
+    return cells.groupby(by, observed=True)[value].sum().reset_index()
+
+
+@dataclass(frozen=True)
+class InventoryCube:
+    cells: pd.DataFrame
+    index: FilterIndex
+
+    def select(self, lots=None, height_range=None, qualities=None, years=None):
+        """Cells matching the Current Inventory sidebar filters; ``None`` leaves a dimension unfiltered."""
+        isin = {"Lot": lots, "Quality": qualities, "Inventory Year": years}
+        return self.index.filter({column: values for column, values in isin.items() if values is not None}, between=height_range)
+
+
+def height_bin_totals(cells):
+    """Count per pie height bin, with every bin present, as ``Tree Height (ft)``/``Count`` columns."""
+    totals = cells.groupby("Height Bin", observed=False)["Count"].sum()
+    return totals.rename_axis("Tree Height (ft)").reset_index()
+
+
+def build_inventory_cube(inventory):
+    cells = rollup(inventory.frame, CUBE_DIMENSIONS)
+    cells["Height Bin"] = pd.cut(cells["Tree Height (ft)"], bins=HEIGHT_BINS, labels=HEIGHT_BIN_LABELS)
+    index = FilterIndex(cells, ["Lot", "Quality", "Inventory Year"], "Tree Height (ft)")
+    return InventoryCube(cells=cells, index=index)
+
+
+def inventory_cube(workbook):
+    """Inventory cube of ``workbook``, built once per workbook."""
+    return workbook.derive("inventory_cube", lambda wb: build_inventory_cube(inventory_dataset(wb)))
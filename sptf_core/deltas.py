@@ -0,0 +1,112 @@
+"""Year-over-year inventory changes per lot and row.
+
+The inventory cube is pivoted once into a dense ``(Lot/Row, Inventory Year,
+Quality)`` count array plus a count-weighted mean height per row and year.
+Every consecutive pair of inventory years is then compared in one set of
+array operations: net change, trees lost and added, A-quality trees that
+were downgraded, and the shift in mean height. Row losses for each pair are
+reconciled with the trees sold in the sales years since the earlier count.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from sptf_core.cube import inventory_cube, rollup
+from sptf_core.sales import sales_cube
+from sptf_core.schema import inventory_dataset
+
+DELTA_MEASURES = ["Lost", "Added", "Downgraded"]
+TOP_QUALITY = "A"
+
+
+def pair_label(pair):
+    return f"{pair[0]} → {pair[1]}"
+
+
+@dataclass(frozen=True)
+class InventoryDeltas:
+    pairs: list
+    rows: pd.DataFrame
+    reconciliation: pd.DataFrame
+
+    def select(self, pair, lot="All"):
+        rows = self.rows[(self.rows["From Year"] == pair[0]) & (self.rows["To Year"] == pair[1])]
+        if lot != "All":
+            rows = rows[rows["Lot"] == lot]
+        return rows
+
+    def by(self, rows, key):
+        """Change measures summed per ``key`` (``"Lot"`` or ``"Row"``), with the count-weighted mean growth."""
+        rows = rows.assign(weighted_growth=rows["Growth (ft)"].fillna(0) * rows["Trees Before"], grown=rows["Growth (ft)"].notna() * rows["Trees Before"])
+        grouped = rows.groupby(key, observed=True)[["Trees Before", "Trees After", "Change", *DELTA_MEASURES, "weighted_growth", "grown"]].sum()
+        grouped["Growth (ft)"] = (grouped["weighted_growth"] / grouped["grown"].where(grouped["grown"] > 0)).round(2)
+        return grouped.drop(columns=["weighted_growth", "grown"]).reset_index()
+
+    def pair_totals(self, pair):
+        return self.reconciliation[(self.reconciliation["From Year"] == pair[0]) & (self.reconciliation["To Year"] == pair[1])].iloc[0]
+
+
+def build_deltas(cells, years, sold_by_year):
+    pairs = list(zip(years, years[1:]))
+    # Every quality code on the sheet, not just the A/B/Cut the filters offer, so counts cover the same trees as heights
+    qualities = list(cells["Quality"].cat.categories)
+    grid = cells.pivot_table(index=["Lot", "Row"], columns=["Inventory Year", "Quality"], values="Count", aggfunc="sum", fill_value=0, observed=True)
+    grid = grid.reindex(columns=pd.MultiIndex.from_product([years, qualities]), fill_value=0)
+    counts = grid.to_numpy(dtype=np.int64).reshape(len(grid), len(years), len(qualities))
+
+    weighted = cells.assign(weighted=cells["Tree Height (ft)"] * cells["Count"])
+    heights = rollup(weighted, ["Lot", "Row", "Inventory Year"], ["weighted", "Count"]).set_index(["Lot", "Row", "Inventory Year"])
+    mean_height = (heights["weighted"] / heights["Count"].where(heights["Count"] > 0)).unstack("Inventory Year")
+    mean_height = mean_height.reindex(index=grid.index, columns=years).to_numpy(dtype=float)
+
+    totals = counts.sum(axis=2)
+    before, after = totals[:, :-1], totals[:, 1:]
+    change = after - before
+    # Downgrades: top-grade (A) trees that disappeared while the row's lower grades grew, whichever is smaller
+    if TOP_QUALITY in qualities:
+        top = list(qualities).index(TOP_QUALITY)
+        top_before, top_after = counts[:, :-1, top], counts[:, 1:, top]
+        lower_before, lower_after = before - top_before, after - top_after
+        downgraded = np.minimum(np.clip(top_before - top_after, 0, None), np.clip(lower_after - lower_before, 0, None))
+    else:
+        # No top grade on the sheet, so nothing can have been downgraded from it
+        downgraded = np.zeros_like(change)
+    growth = mean_height[:, 1:] - mean_height[:, :-1]
+
+    lots = grid.index.get_level_values("Lot")
+    row_numbers = grid.index.get_level_values("Row")
+    rows = pd.DataFrame(
+        {
+            "From Year": np.repeat([[p[0] for p in pairs]], len(grid), axis=0).ravel(),
+            "To Year": np.repeat([[p[1] for p in pairs]], len(grid), axis=0).ravel(),
+            "Lot": lots.repeat(len(pairs)),
+            "Row": row_numbers.repeat(len(pairs)),
+            "Trees Before": before.ravel(),
+            "Trees After": after.ravel(),
+            "Change": change.ravel(),
+            "Lost": np.clip(-change, 0, None).ravel(),
+            "Added": np.clip(change, 0, None).ravel(),
+            "Downgraded": downgraded.ravel(),
+            "Growth (ft)": growth.ravel().round(2),
+        }
+    )
+    rows = rows[(rows["Trees Before"] > 0) | (rows["Trees After"] > 0)].reset_index(drop=True)
+
+    per_pair = rows.groupby(["From Year", "To Year"])[["Trees Before", "Trees After", "Change", *DELTA_MEASURES]].sum().reindex(pd.MultiIndex.from_tuples(pairs, names=["From Year", "To Year"]), fill_value=0)
+    reconciliation = per_pair.reset_index()
+    reconciliation["Sold"] = [int(sold_by_year[(sold_by_year.index > y0) & (sold_by_year.index <= y1)].sum()) for y0, y1 in pairs]
+    reconciliation["Lost Beyond Sales"] = reconciliation["Lost"] - reconciliation["Sold"]
+    return InventoryDeltas(pairs=pairs, rows=rows, reconciliation=reconciliation)
+
+
+def inventory_deltas(workbook):
+    """Year-over-year changes of ``workbook``'s inventory, built once per workbook."""
+
+    def build(wb):
+        inventory = inventory_dataset(wb)
+        sold = sales_cube(wb).cells.groupby("Sales Year")["Quantity"].sum()
+        return build_deltas(inventory_cube(wb).cells, inventory.years, sold)
+
+    return workbook.derive("inventory_deltas", build)
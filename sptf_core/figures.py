@@ -0,0 +1,105 @@
+"""Process-wide LRU cache of built Plotly figures.
+
+Field staff tend to flip between the same handful of lots and years, and
+every rerun used to rebuild each ``px.bar``/``px.pie`` from scratch. Figures
+are cached under ``(page, chart, dataset version, normalized filters)`` and
+shared by every session. Entries are evicted least-recently-used once either
+the entry count or the total size of their trace data arrays exceeds its
+limit. Cached figures are shared, so treat them as read-only.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _normalize(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray)):
+        items = [_normalize(item) for item in value]
+        if isinstance(value, (set, frozenset, list, np.ndarray)):
+            return tuple(sorted(set(items), key=lambda item: (type(item).__name__, item)))
+        return tuple(items)
+    return value
+
+
+def normalize_filters(**filters):
+    """Hashable, order-independent key for a page's filter state."""
+    return tuple(sorted((name, _normalize(value)) for name, value in filters.items()))
+
+
+# Per-point trace properties, which hold nearly all of a figure's data
+DATA_PROPERTIES = ("x", "y", "z", "values", "labels", "text", "hovertext", "customdata", "ids", "parents", "lat", "lon", "r", "theta")
+
+
+def figure_size(figure):
+    """Estimated bytes of ``figure``'s trace data, without serializing it."""
+    size = 0
+    for trace in figure.data:
+        for name in DATA_PROPERTIES:
+            if name not in trace:
+                continue
+            value = trace[name]
+            if value is None or isinstance(value, str):
+                continue
+            array = np.asarray(value)
+            # Object arrays (labels, categories) hold pointers; count each item as a short string
+            size += array.size * 16 if array.dtype.kind == "O" else array.nbytes
+    return size
+
+
+class FigureCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, build):
+        """Return the cached figure for ``key``, calling ``build()`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        figure = build()
+        size = figure_size(figure)
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (figure, size)
+                self._bytes += size
+                self._evict()
+        return figure
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+figure_cache = FigureCache()
@@ -0,0 +1,270 @@
+"""Append-only multi-year store of workbook sheets.
+
+Each yearly workbook (``SPTF_Count_archived.xlsx``, ``SPTF_Inventory_25.xlsx``,
+...) is ingested once. Every sheet is split by year into sealed Arrow
+partitions at ``.sptf_cache/history/<sheet>/<year>/<source>.part``, and
+``manifest.json`` records the source, row counts, duplicates dropped and how
+its schema differs from today's (missing or extra columns, quality codes
+such as the old A/B/C/OC instead of A/B/Cut). Rows already present in a
+partition are not written again (as a multiset: a row repeated within a
+workbook keeps its repeats), and partitions are never rewritten, so
+ingesting a new season only adds files. ``read(sheet, years)`` opens only the
+partitions of the requested years.
+
+Partitions are sealed with AES-GCM under a key derived from the password
+with scrypt. The salt and a check value live in the manifest, so a wrong
+password is rejected before anything is read. Needs ``pyarrow``.
+"""
+
+import argparse
+import getpass
+import hashlib
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import pandas as pd
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from sptf_core.crypto import key_cache, password_digest
+from sptf_core.schema import INVENTORY_COLUMNS, QUALITY_ORDER, SALES_COLUMNS, SALES_QUALITY_ORDER
+from sptf_core.snapshot import SNAPSHOT_DIR, pa, read_sealed, table_frame, write_sealed
+from sptf_core.workbook import LazyWorkbook
+
+HISTORY_DIR = os.path.join(SNAPSHOT_DIR, "history")
+UNDATED = "undated"
+YEAR_COLUMNS = {"Inventory": "Inventory Year", "Sales": "Sales Year", "Planting": "Date"}
+EXPECTED_COLUMNS = {"Inventory": INVENTORY_COLUMNS, "Sales": SALES_COLUMNS}
+EXPECTED_QUALITIES = {"Inventory": QUALITY_ORDER, "Sales": SALES_QUALITY_ORDER}
+
+_CHECK = b"sptf-history-v1"
+
+
+def _safe(name):
+    return re.sub(r"[^A-Za-z0-9_-]", "_", str(name))
+
+
+def year_column(sheet, frame):
+    column = YEAR_COLUMNS.get(sheet)
+    if column in frame.columns:
+        return column
+    for column in frame.columns:
+        if str(column).endswith("Year") or str(column) == "Date":
+            return column
+    return None
+
+
+def partition_years(sheet, frame):
+    """Partition label (year as text, or ``UNDATED``) for every row of ``frame``."""
+    column = year_column(sheet, frame)
+    if column is None:
+        return pd.Series(UNDATED, index=frame.index)
+    values = frame[column]
+    if str(column) == "Date" or pd.api.types.is_datetime64_any_dtype(values):
+        years = pd.to_datetime(values, errors="coerce").dt.year
+    else:
+        years = pd.to_numeric(values, errors="coerce")
+    labels = years.astype("Int64").astype("string")
+    return labels.fillna(UNDATED).astype(str)
+
+
+def schema_differences(sheet, frame):
+    """How ``frame`` differs from the columns and quality codes the app expects for ``sheet``."""
+    notes = {}
+    expected = EXPECTED_COLUMNS.get(sheet)
+    if expected is not None:
+        columns = [str(column) for column in frame.columns]
+        missing = [column for column in expected if column not in columns]
+        extra = [column for column in columns if column not in expected]
+        if missing:
+            notes["missing_columns"] = missing
+        if extra:
+            notes["extra_columns"] = extra
+    if "Quality" in frame.columns and sheet in EXPECTED_QUALITIES:
+        codes = sorted(str(code) for code in frame["Quality"].dropna().unique())
+        unknown = [code for code in codes if code not in EXPECTED_QUALITIES[sheet]]
+        if unknown:
+            notes["quality_codes"] = codes
+            notes["unknown_quality_codes"] = unknown
+    return notes
+
+
+def row_hashes(frame):
+    """Content hash per row, independent of column order and of int/float storage."""
+    columns = sorted(frame.columns, key=str)
+    canonical = pd.DataFrame(
+        {
+            str(column): (frame[column].astype("float64") if pd.api.types.is_numeric_dtype(frame[column]) else frame[column]).astype(str)
+            for column in columns
+        }
+    )
+    return pd.util.hash_pandas_object(canonical, index=False)
+
+
+class HistoryStore:
+    def __init__(self, password, root=HISTORY_DIR):
+        if pa is None:
+            raise RuntimeError("the history store needs pyarrow")
+        self.root = root
+        self._lock = threading.RLock()
+        self._manifest_path = os.path.join(root, "manifest.json")
+        self._manifest = self._read_manifest()
+        self._key = self._unlock(password)
+        self._parts = {}
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"version": 1, "salt": os.urandom(16).hex(), "check": None, "sources": []}
+
+    def _write_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        temp = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(temp, "w") as file:
+            json.dump(self._manifest, file, indent=1)
+        os.replace(temp, self._manifest_path)
+
+    def _unlock(self, password):
+        salt = bytes.fromhex(self._manifest["salt"])
+        cache_key = ("history", salt, password_digest(password))
+        key = key_cache.get(cache_key)
+        if key is None:
+            key = Scrypt(salt=salt, length=32, n=2**15, r=8, p=1).derive(password.encode("utf-8"))
+        check = hmac.new(key, _CHECK, hashlib.sha256).hexdigest()
+        if self._manifest["check"] is None:
+            self._manifest["check"] = check
+        elif not hmac.compare_digest(check, self._manifest["check"]):
+            raise ValueError("wrong password for the history store")
+        key_cache.put(cache_key, key)
+        return key
+
+    def _part_path(self, sheet, year, source):
+        return os.path.join(self.root, _safe(sheet), _safe(year), f"{source}.part")
+
+    def _partitions(self, sheet, years=None):
+        wanted = None if years is None else {str(year) for year in years}
+        for source in self._manifest["sources"]:
+            for year, part in source["sheets"].get(sheet, {}).get("partitions", {}).items():
+                if wanted is None or year in wanted:
+                    yield source["source"], year, part
+
+    def _read_part(self, sheet, year, source):
+        path = self._part_path(sheet, year, source)
+        with self._lock:
+            frame = self._parts.get(path)
+        if frame is None:
+            opened = read_sealed(path, self._key, lambda header: header["sheet"] == sheet and header["year"] == year)
+            if opened is None:
+                raise OSError(f"history partition {path} is missing or corrupt")
+            frame = table_frame(*opened)
+            with self._lock:
+                self._parts[path] = frame
+        return frame
+
+    def sources(self):
+        return [{key: source[key] for key in ("source", "name", "ingested")} for source in self._manifest["sources"]]
+
+    def sheets(self):
+        return sorted({sheet for source in self._manifest["sources"] for sheet in source["sheets"]})
+
+    def years(self, sheet):
+        return sorted({year for _, year, _ in self._partitions(sheet)})
+
+    def ingest(self, path, password):
+        """Add the workbook at ``path`` unless it is already in the store; returns its manifest entry."""
+        workbook = LazyWorkbook(path, password)
+        with self._lock:
+            for source in self._manifest["sources"]:
+                if source["source"] == workbook.version:
+                    return source
+            entry = {"source": workbook.version, "name": os.path.basename(path), "ingested": time.strftime("%Y-%m-%dT%H:%M:%S"), "sheets": {}}
+            for sheet in workbook.sheet_names():
+                frame = workbook[sheet]
+                partitions, duplicates = {}, 0
+                for year, rows in frame.groupby(partition_years(sheet, frame), sort=True):
+                    rows = rows.reset_index(drop=True)
+                    hashes = row_hashes(rows)
+                    stored = [row_hashes(self._read_part(sheet, other_year, other)) for other, other_year, _ in self._partitions(sheet, [year])]
+                    stored = pd.concat(stored).value_counts() if stored else pd.Series(dtype="int64")
+                    # Repeated rows are separate records: keep the copies beyond those already stored
+                    occurrence = hashes.groupby(hashes, sort=False).cumcount()
+                    keep = occurrence.to_numpy() >= hashes.map(stored).fillna(0).to_numpy()
+                    new_rows = rows[keep]
+                    duplicates += len(rows) - len(new_rows)
+                    if new_rows.empty:
+                        continue
+                    target = self._part_path(sheet, year, workbook.version)
+                    if not write_sealed(target, new_rows, self._key, {"sheet": sheet, "year": year, "source": workbook.version}):
+                        raise OSError(f"could not write history partition {target}")
+                    partitions[year] = {"rows": len(new_rows)}
+                entry["sheets"][sheet] = {"schema": schema_differences(sheet, frame), "duplicates": int(duplicates), "partitions": partitions}
+            self._manifest["sources"].append(entry)
+            self._write_manifest()
+            return entry
+
+    def read(self, sheet, years=None, columns=None):
+        """Rows of ``sheet`` for ``years`` (all when ``None``), reading only those partitions.
+
+        Columns a source did not have come back as missing values.
+        """
+        frames = [self._read_part(sheet, year, source) for source, year, _ in self._partitions(sheet, years)]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        frame = pd.concat(frames, ignore_index=True)
+        return frame if columns is None else frame.reindex(columns=list(columns))
+
+    def schema_report(self):
+        """One row per ingested sheet with its schema differences."""
+        rows = [
+            {
+                "Source": source["name"],
+                "Sheet": sheet,
+                "Years": ", ".join(info["partitions"]),
+                "Duplicates": info["duplicates"],
+                "Differences": json.dumps(info["schema"]) if info["schema"] else "",
+            }
+            for source in self._manifest["sources"]
+            for sheet, info in source["sheets"].items()
+        ]
+        return pd.DataFrame(rows, columns=["Source", "Sheet", "Years", "Duplicates", "Differences"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sptf_core.history", description="Ingest workbooks into the history store and inspect it.")
+    parser.add_argument("--root", default=HISTORY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="add workbooks (each is skipped if already ingested)")
+    ingest.add_argument("paths", nargs="+")
+    commands.add_parser("schema", help="print each source's schema differences")
+    years = commands.add_parser("rows", help="print row counts per year of a sheet")
+    years.add_argument("sheet")
+    years.add_argument("--years", nargs="+")
+    args = parser.parse_args(argv)
+
+    password = os.environ.get("SPTF_PASSWORD") or getpass.getpass("Excel File Password: ")
+    try:
+        store = HistoryStore(password, root=args.root)
+    except (RuntimeError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    if args.command == "ingest":
+        for path in args.paths:
+            entry = store.ingest(path, password)
+            written = {sheet: sum(part["rows"] for part in info["partitions"].values()) for sheet, info in entry["sheets"].items()}
+            print(json.dumps({"source": entry["name"], "rows": written}))
+    elif args.command == "schema":
+        print(store.schema_report().to_string(index=False))
+    else:
+        frame = store.read(args.sheet, args.years)
+        print(frame.groupby(partition_years(args.sheet, frame)).size().to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Posting-list filter index shared by the Inventory, Sales and Planting pages.
+
+``FilterIndex`` is built once per dataset. For each indexed column it stores
+the row ids of every distinct value (a posting list), and for the range
+column it stores the values sorted with their row ids, so a height range is
+two binary searches. A filter turns each predicate into a boolean mask from
+those lists and ANDs the masks; predicates that select every value of a
+column without gaps are skipped entirely.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _scalar(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+class FilterIndex:
+    def __init__(self, frame, columns, range_column=None):
+        self.frame = frame
+        self.size = len(frame)
+        self._postings = {}
+        self._complete = {}
+        for column in columns:
+            codes, uniques = pd.factorize(frame[column], sort=False)
+            order = np.argsort(codes, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self._postings[column] = {
+                _scalar(value): order[bounds[code] : bounds[code + 1]] for code, value in enumerate(uniques)
+            }
+            self._complete[column] = bool((codes >= 0).all())
+
+        self.range_column = range_column
+        if range_column is not None:
+            values = frame[range_column].to_numpy(dtype=float, na_value=np.nan)
+            valid = np.flatnonzero(~np.isnan(values))
+            order = valid[np.argsort(values[valid], kind="stable")]
+            self._range_order = order
+            self._range_values = values[order]
+            self._complete[range_column] = len(valid) == self.size
+
+    def values(self, column):
+        return list(self._postings[column])
+
+    def isin_mask(self, column, values):
+        """Boolean mask of rows whose ``column`` is in ``values``, or None if that is every row."""
+        postings = self._postings[column]
+        wanted = set(values)
+        if self._complete[column] and wanted.issuperset(postings):
+            return None
+        mask = np.zeros(self.size, dtype=bool)
+        for value in wanted:
+            rows = postings.get(value)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def between_mask(self, low, high):
+        """Boolean mask of rows whose range column lies in ``[low, high]``, or None if that is every row."""
+        start = np.searchsorted(self._range_values, low, side="left")
+        stop = np.searchsorted(self._range_values, high, side="right")
+        if self._complete[self.range_column] and start == 0 and stop == self.size:
+            return None
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self._range_order[start:stop]] = True
+        return mask
+
+    def mask(self, isin=None, between=None):
+        """AND of ``isin`` ({column: values}) and ``between`` ((low, high) on the range column); None means all rows."""
+        masks = [self.isin_mask(column, values) for column, values in (isin or {}).items()]
+        if between is not None:
+            masks.append(self.between_mask(*between))
+        result = None
+        for mask in masks:
+            if mask is not None:
+                result = mask if result is None else result & mask
+        return result
+
+    def filter(self, isin=None, between=None):
+        """Rows of the indexed frame matching the predicates (the frame itself if nothing is filtered out)."""
+        mask = self.mask(isin, between)
+        return self.frame if mask is None else self.frame[mask]
+
@@ -0,0 +1,345 @@
+"""Tiled lot map with per-lot inventory overlays.
+
+``map_larger.png`` is a 1.8 MB photo saved as PNG, too heavy to send whole on
+every visit over a rural connection. ``build_tiles`` cuts it once into a
+pyramid of 256 px tiles, WebP with PNG fallbacks, plus one downscaled image per
+level. Level ``z`` is the map scaled by ``2 ** (z - max_zoom)``, so the top
+level is full size. The pyramid is written to
+``static/map_tiles/<image hash>/``, which Streamlit serves as static files
+(``server.enableStaticServing``). The viewer therefore fetches only the
+tiles in view, and browsers cache them under URLs that change with the
+image.
+
+``LOT_POLYGONS`` outlines each lot in the pixel coordinates of the map.
+``lot_overlay(workbook)`` joins the outlines with Inventory counts per lot
+and year, and picks the colours, once per workbook.
+
+    python -m sptf_core.lotmap [--image map_larger.png] [--out static/map_tiles]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+from dataclasses import dataclass
+
+from PIL import Image
+
+from sptf_core.cube import inventory_cube, rollup
+
+MAP_IMAGE = "map_larger.png"
+TILE_DIR = os.path.join("static", "map_tiles")
+TILE_SIZE = 256
+TILE_FORMATS = ("webp", "png")
+
+# Lot outlines traced on map_larger.png, in its pixel coordinates
+POLYGON_IMAGE_SIZE = (1011, 720)
+LOT_POLYGONS = {
+    0: ((463, 570), (527, 570), (527, 615), (457, 616)),
+    1: ((529, 491), (556, 491), (555, 618), (530, 617)),
+    2: ((556, 481), (584, 481), (584, 615), (557, 617)),
+    3: ((584, 477), (622, 476), (621, 615), (584, 616)),
+    4: ((533, 442), (620, 441), (620, 470), (533, 470)),
+    5: ((620, 332), (621, 400), (584, 398), (580, 386)),
+    6: ((618, 261), (620, 331), (580, 386), (540, 378)),
+    7: ((589, 243), (607, 245), (615, 258), (535, 374), (505, 360)),
+    8: ((559, 238), (589, 243), (505, 360), (483, 344), (540, 260)),
+    9: ((514, 241), (540, 260), (481, 341), (455, 325)),
+    10: ((454, 332), (475, 347), (430, 402), (428, 396), (440, 360)),
+    11: ((475, 347), (528, 380), (470, 465), (427, 428), (430, 402)),
+    12: ((528, 380), (542, 387), (480, 477), (470, 465)),
+    13: ((423, 432), (480, 477), (400, 562), (373, 551), (410, 448)),
+    14: ((470, 519), (527, 520), (527, 569), (463, 569), (463, 542)),
+    15: ((428, 617), (454, 618), (454, 701), (428, 702)),
+    16: ((563, 135), (617, 136), (620, 241), (563, 231)),
+    17: ((572, 70), (620, 62), (620, 134), (572, 134)),
+}
+
+# Overlay colours run from the lightest to the darkest green with the lot's share of the year's largest count
+LOW_COLOR = "#e5f5e0"
+HIGH_COLOR = "#006d2c"
+EMPTY_COLOR = "#bdbdbd"
+
+_build_lock = threading.Lock()
+_manifests = {}
+
+
+def image_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()[:12]
+
+
+def _save(image, path):
+    if path.endswith(".webp"):
+        image.save(path, "WEBP", quality=80, method=6)
+    else:
+        image.save(path, "PNG", optimize=True)
+
+
+def build_tiles(image=MAP_IMAGE, out=TILE_DIR, tile_size=TILE_SIZE):
+    """Cut ``image`` into a tile pyramid under ``out/<image hash>/`` and return its manifest.
+
+    A pyramid that already exists for the same image is reused as is.
+    """
+    digest = image_digest(image)
+    target = os.path.join(out, digest)
+    manifest_path = os.path.join(target, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            return json.load(file)
+
+    source = Image.open(image).convert("RGB")
+    width, height = source.size
+    max_zoom = max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+    temp = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(temp, ignore_errors=True)
+    levels = []
+    for zoom in range(max_zoom + 1):
+        scale = 2 ** (zoom - max_zoom)
+        size = (max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale)))
+        level = source if zoom == max_zoom else source.resize(size, Image.LANCZOS)
+        columns, rows = math.ceil(size[0] / tile_size), math.ceil(size[1] / tile_size)
+        os.makedirs(os.path.join(temp, str(zoom)))
+        for fmt in TILE_FORMATS:
+            _save(level, os.path.join(temp, f"{zoom}.{fmt}"))
+            for x in range(columns):
+                for y in range(rows):
+                    box = (x * tile_size, y * tile_size, min((x + 1) * tile_size, size[0]), min((y + 1) * tile_size, size[1]))
+                    _save(level.crop(box), os.path.join(temp, str(zoom), f"{x}_{y}.{fmt}"))
+        levels.append({"zoom": zoom, "width": size[0], "height": size[1], "columns": columns, "rows": rows})
+
+    manifest = {
+        "source": digest,
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "max_zoom": max_zoom,
+        "levels": levels,
+        "formats": list(TILE_FORMATS),
+    }
+    with open(os.path.join(temp, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=1)
+    try:
+        os.replace(temp, target)
+    except OSError:  # another process finished the same pyramid first
+        shutil.rmtree(temp, ignore_errors=True)
+    return manifest
+
+
+def map_tiles(image=MAP_IMAGE, out=TILE_DIR):
+    """Manifest of the tile pyramid for ``image``, built on first use and remembered until the image changes."""
+    stat = os.stat(image)
+    key = (os.path.abspath(image), os.path.abspath(out), stat.st_mtime_ns, stat.st_size)
+    with _build_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = build_tiles(image, out)
+    return manifest
+
+
+def tile_path(manifest, name, out=TILE_DIR):
+    """Path of a file in the pyramid, e.g. ``tile_path(manifest, "2.webp")`` for the full-size image."""
+    return os.path.join(out, manifest["source"], name)
+
+
+def _mix(low, high, share):
+    low, high = (tuple(int(color[i : i + 2], 16) for i in (1, 3, 5)) for color in (low, high))
+    return "#" + "".join(f"{round(a + (b - a) * share):02x}" for a, b in zip(low, high))
+
+
+@dataclass(frozen=True)
+class LotShape:
+    lot: int
+    points: tuple
+    count: int
+    color: str
+
+
+@dataclass(frozen=True)
+class LotOverlay:
+    years: list
+    shapes: dict
+    unmapped: list
+
+    def layer(self, year):
+        """The lot shapes coloured by ``year``'s counts, as plain dicts for the viewer."""
+        return [
+            {"lot": shape.lot, "points": shape.points, "count": shape.count, "color": shape.color}
+            for shape in self.shapes[year]
+        ]
+
+
+def build_lot_overlay(counts, polygons=LOT_POLYGONS):
+    """Shapes per inventory year from ``counts`` (``Lot``, ``Inventory Year``, ``Count`` columns)."""
+    totals = {(int(lot), year): int(count) for lot, year, count in counts[["Lot", "Inventory Year", "Count"]].itertuples(index=False)}
+    years = sorted({year for _, year in totals})
+    shapes = {}
+    for year in years:
+        largest = max((count for (_, count_year), count in totals.items() if count_year == year), default=0)
+        layer = []
+        for lot, points in polygons.items():
+            count = totals.get((lot, year), 0)
+            color = _mix(LOW_COLOR, HIGH_COLOR, count / largest) if count and largest else EMPTY_COLOR
+            layer.append(LotShape(lot=lot, points=points, count=count, color=color))
+        shapes[year] = tuple(layer)
+    unmapped = sorted({lot for lot, _ in totals} - set(polygons))
+    return LotOverlay(years=years, shapes=shapes, unmapped=unmapped)
+
+
+def lot_overlay(workbook):
+    """Lot shapes coloured by Inventory counts, built once per workbook."""
+    return workbook.derive("lot_overlay", lambda wb: build_lot_overlay(rollup(inventory_cube(wb).cells, ["Lot", "Inventory Year"])))
+
+
+VIEWER_TEMPLATE = """
+<div id="map" style="position:relative;overflow:hidden;height:__HEIGHT__px;background:#26301f;cursor:grab;touch-action:none;font-family:sans-serif">
+  <div id="tiles" style="position:absolute;left:0;top:0"></div>
+  <svg id="lots" style="position:absolute;left:0;top:0;width:100%;height:100%;overflow:visible"><g id="shapes"></g></svg>
+  <div style="position:absolute;right:8px;top:8px;display:flex;flex-direction:column;gap:4px">
+    <button id="zoom-in" title="Zoom in" style="width:30px;height:30px">+</button>
+    <button id="zoom-out" title="Zoom out" style="width:30px;height:30px">&minus;</button>
+    <button id="reset" title="Fit map" style="width:30px;height:30px">&#8962;</button>
+  </div>
+  <div id="tip" style="position:absolute;display:none;pointer-events:none;background:rgba(0,0,0,.75);color:#fff;padding:3px 6px;border-radius:3px;font-size:13px"></div>
+</div>
+<script>
+const MAP = __MANIFEST__, SHAPES = __SHAPES__, BASE = __BASE__, SCALE = __SCALE__;
+const ext = document.createElement("canvas").toDataURL("image/webp").startsWith("data:image/webp") ? "webp" : "png";
+const box = document.getElementById("map"), tiles = document.getElementById("tiles"), group = document.getElementById("shapes"), tip = document.getElementById("tip");
+const loaded = new Map();
+let view = {x: 0, y: 0, scale: 1};
+
+for (const shape of SHAPES) {
+  const polygon = document.createElementNS("http://www.w3.org/2000/svg", "polygon");
+  polygon.setAttribute("points", shape.points.map(([x, y]) => `${x * SCALE[0]},${y * SCALE[1]}`).join(" "));
+  polygon.setAttribute("fill", shape.color);
+  polygon.setAttribute("fill-opacity", "0.6");
+  polygon.setAttribute("stroke", "#ffffff");
+  polygon.setAttribute("vector-effect", "non-scaling-stroke");
+  polygon.addEventListener("pointermove", (event) => {
+    const rect = box.getBoundingClientRect();
+    tip.textContent = `Lot ${shape.lot}: ${shape.count.toLocaleString()} trees`;
+    tip.style.left = `${event.clientX - rect.left + 12}px`;
+    tip.style.top = `${event.clientY - rect.top + 12}px`;
+    tip.style.display = "block";
+  });
+  polygon.addEventListener("pointerleave", () => { tip.style.display = "none"; });
+  group.appendChild(polygon);
+}
+
+function render() {
+  const zoom = Math.max(0, Math.min(MAP.max_zoom, MAP.max_zoom + Math.ceil(Math.log2(view.scale * (window.devicePixelRatio || 1)))));
+  const level = MAP.levels[zoom], factor = 2 ** (zoom - MAP.max_zoom), size = MAP.tile_size;
+  const step = size / factor * view.scale;
+  const x0 = Math.max(0, Math.floor(-view.x / step)), x1 = Math.min(level.columns - 1, Math.floor((box.clientWidth - view.x) / step));
+  const y0 = Math.max(0, Math.floor(-view.y / step)), y1 = Math.min(level.rows - 1, Math.floor((box.clientHeight - view.y) / step));
+  const wanted = new Set();
+  for (let x = x0; x <= x1; x++) {
+    for (let y = y0; y <= y1; y++) {
+      const key = `${zoom}/${x}_${y}`;
+      wanted.add(key);
+      let img = loaded.get(key);
+      if (!img) {
+        img = document.createElement("img");
+        img.src = `${BASE}${key}.${ext}`;
+        img.draggable = false;
+        img.style.position = "absolute";
+        tiles.appendChild(img);
+        loaded.set(key, img);
+      }
+      img.style.left = `${view.x + x * step}px`;
+      img.style.top = `${view.y + y * step}px`;
+      img.style.width = `${Math.min(size, level.width - x * size) / factor * view.scale}px`;
+      img.style.height = `${Math.min(size, level.height - y * size) / factor * view.scale}px`;
+    }
+  }
+  for (const [key, img] of loaded) {
+    if (!wanted.has(key)) { img.remove(); loaded.delete(key); }
+  }
+  group.setAttribute("transform", `translate(${view.x},${view.y}) scale(${view.scale})`);
+}
+
+function fit() {
+  const scale = Math.min(box.clientWidth / MAP.width, box.clientHeight / MAP.height);
+  view = {scale, x: (box.clientWidth - MAP.width * scale) / 2, y: (box.clientHeight - MAP.height * scale) / 2};
+  render();
+}
+
+function zoomAt(factor, cx, cy) {
+  const fitted = Math.min(box.clientWidth / MAP.width, box.clientHeight / MAP.height);
+  const scale = Math.max(fitted / 2, Math.min(8, view.scale * factor));
+  view = {scale, x: cx - (cx - view.x) * scale / view.scale, y: cy - (cy - view.y) * scale / view.scale};
+  render();
+}
+
+let drag = null;
+box.addEventListener("pointerdown", (event) => {
+  if (event.target.tagName === "BUTTON") return;
+  drag = {x: event.clientX - view.x, y: event.clientY - view.y};
+  box.setPointerCapture(event.pointerId);
+  box.style.cursor = "grabbing";
+});
+box.addEventListener("pointermove", (event) => {
+  if (!drag) return;
+  view.x = event.clientX - drag.x;
+  view.y = event.clientY - drag.y;
+  render();
+});
+box.addEventListener("pointerup", () => { drag = null; box.style.cursor = "grab"; });
+box.addEventListener("wheel", (event) => {
+  event.preventDefault();
+  const rect = box.getBoundingClientRect();
+  zoomAt(event.deltaY < 0 ? 1.25 : 0.8, event.clientX - rect.left, event.clientY - rect.top);
+}, {passive: false});
+box.addEventListener("dblclick", (event) => {
+  const rect = box.getBoundingClientRect();
+  zoomAt(2, event.clientX - rect.left, event.clientY - rect.top);
+});
+document.getElementById("zoom-in").onclick = () => zoomAt(1.5, box.clientWidth / 2, box.clientHeight / 2);
+document.getElementById("zoom-out").onclick = () => zoomAt(1 / 1.5, box.clientWidth / 2, box.clientHeight / 2);
+document.getElementById("reset").onclick = fit;
+window.addEventListener("resize", fit);
+fit();
+</script>
+"""
+
+
+def viewer_html(manifest, shapes=(), base_url=None, height=600):
+    """Self-contained pan/zoom viewer that loads the tiles in view from ``base_url``.
+
+    ``shapes`` are ``LotOverlay.layer(year)`` dicts drawn over the map. The
+    default ``base_url`` is where Streamlit serves ``static/map_tiles``.
+    """
+    if base_url is None:
+        base_url = f"app/static/map_tiles/{manifest['source']}/"
+    scale = (manifest["width"] / POLYGON_IMAGE_SIZE[0], manifest["height"] / POLYGON_IMAGE_SIZE[1])
+    replacements = {
+        "__HEIGHT__": str(int(height)),
+        "__MANIFEST__": json.dumps(manifest),
+        "__SHAPES__": json.dumps(list(shapes)),
+        "__BASE__": json.dumps(base_url),
+        "__SCALE__": json.dumps(scale),
+    }
+    html = VIEWER_TEMPLATE
+    for marker, value in replacements.items():
+        html = html.replace(marker, value)
+    return html
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sptf_core.lotmap", description="Build the lot map tile pyramid.")
+    parser.add_argument("--image", default=MAP_IMAGE)
+    parser.add_argument("--out", default=TILE_DIR)
+    args = parser.parse_args(argv)
+    manifest = build_tiles(args.image, args.out)
+    files = [os.path.join(root, name) for root, _, names in os.walk(os.path.join(args.out, manifest["source"])) for name in names]
+    print(json.dumps({"path": os.path.join(args.out, manifest["source"]), "levels": len(manifest["levels"]), "files": len(files), "bytes": sum(os.path.getsize(path) for path in files)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
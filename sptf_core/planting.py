@@ -0,0 +1,172 @@
+"""Long-format Planting table and its precomputed rollups.
+
+The Planting sheet has one column per tree height in inches ("12", "18", ...).
+It is melted to ``[Date, Year, Lot #, Row #, Tree Height (in), Count]`` once
+per workbook, and the counts are also laid out as a dense
+``Year x Lot x Height`` array. Every chart on the Planting History page that
+is not per-row is an axis sum over a slice of that array, so moving the
+height slider only slices it. The per-row chart for a single lot filters the
+(Year, Lot, Row, Height) cells through a ``FilterIndex``.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from sptf_core.cube import rollup
+from sptf_core.index import FilterIndex
+from sptf_core.schema import lot_sort_key, small_int
+
+PLANTING_ID_COLUMNS = ["Date", "Year", "Lot #", "Row #"]
+
+
+def melt_planting(frame):
+    """Unpivot the digit-named height columns of the Planting sheet into long format."""
+    planting_data = frame.copy()
+    planting_data["Date"] = pd.to_datetime(planting_data["Date"])
+    planting_data["Year"] = planting_data["Date"].dt.year
+
+    height_columns = [col for col in planting_data.columns if col not in PLANTING_ID_COLUMNS and str(col).strip().isdigit()]
+    long_df = planting_data.melt(
+        id_vars=PLANTING_ID_COLUMNS,
+        value_vars=height_columns,
+        var_name="Tree Height (in)",
+        value_name="Count",
+    )
+    long_df["Tree Height (in)"] = pd.to_numeric(long_df["Tree Height (in)"], errors="coerce")
+    long_df = long_df.dropna(subset=["Tree Height (in)", "Count"])
+    long_df["Count"] = long_df["Count"].astype(int)
+    return long_df.reset_index(drop=True)
+
+
+def _position(labels, values):
+    lookup = {label: i for i, label in enumerate(labels)}
+    return np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+
+
+@dataclass(frozen=True)
+class PlantingSelection:
+    """A ``Year x Lot x Height`` block of planting counts with its axis labels."""
+
+    counts: np.ndarray
+    years: list
+    lots: list
+    heights: list
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def _frame(self, sums, row_labels, column_labels, row_name, column_name):
+        rows, columns = np.nonzero(sums)
+        return pd.DataFrame(
+            {
+                row_name: [row_labels[i] for i in rows],
+                column_name: [column_labels[j] for j in columns],
+                "Count": sums[rows, columns],
+            }
+        )
+
+    def height_by_year(self):
+        return self._frame(self.counts.sum(axis=1).T, self.heights, self.years, "Tree Height (in)", "Year")
+
+    def height_totals(self):
+        sums = self.counts.sum(axis=(0, 1))
+        keep = np.nonzero(sums)[0]
+        return pd.DataFrame({"Tree Height (in)": [self.heights[i] for i in keep], "Count": sums[keep]})
+
+    def lot_by_year(self):
+        named = [i for i, lot in enumerate(self.lots) if lot is not None]
+        sums = self.counts[:, named, :].sum(axis=2).T
+        return self._frame(sums, [self.lots[i] for i in named], self.years, "Lot #", "Year")
+
+
+@dataclass(frozen=True)
+class PlantingData:
+    long: pd.DataFrame
+    cells: pd.DataFrame
+    index: FilterIndex
+    counts: np.ndarray
+    years: list
+    lots: list
+    lot_axis: list
+    heights: list
+    height_range: tuple
+
+    def select(self, years=None, lot="All", height_range=None):
+        """Counts for the selected years, lot ("All" for every lot) and inclusive inch-height range.
+
+        ``None`` selects every year or height.
+        """
+        year_positions = np.sort(_position(self.years, self.years if years is None else years))
+        year_positions = year_positions[year_positions >= 0]
+        height_range = height_range or (-np.inf, np.inf)
+        if lot == "All":
+            lot_positions = np.arange(len(self.lot_axis))
+        else:
+            lot_positions = _position(self.lot_axis, [lot])
+            lot_positions = lot_positions[lot_positions >= 0]
+        heights = np.asarray(self.heights, dtype=float)
+        start = np.searchsorted(heights, height_range[0], side="left")
+        stop = np.searchsorted(heights, height_range[1], side="right")
+
+        block = self.counts[np.ix_(year_positions, lot_positions, np.arange(start, stop))]
+        return PlantingSelection(
+            counts=block,
+            years=[self.years[i] for i in year_positions],
+            lots=[self.lot_axis[i] for i in lot_positions],
+            heights=self.heights[start:stop],
+        )
+
+    def row_totals(self, years, lot, height_range=None):
+        """Trees planted per row of ``lot``; ``years=None`` selects every year."""
+        isin = {"Lot #": [lot]} if years is None else {"Year": years, "Lot #": [lot]}
+        cells = self.index.filter(isin, between=height_range)
+        return rollup(cells, "Row #")
+
+
+def _axis(values, key=None):
+    return sorted((v.item() if hasattr(v, "item") else v for v in pd.unique(values.dropna())), key=key)
+
+
+def build_planting(frame):
+    long_df = melt_planting(frame)
+    long_df["Year"] = small_int(long_df["Year"], min_bits=16)
+    long_df["Lot #"] = small_int(long_df["Lot #"])
+    long_df["Row #"] = small_int(long_df["Row #"])
+
+    years = _axis(long_df["Year"])
+    lots = _axis(long_df["Lot #"], key=lot_sort_key)
+    # Rows without a lot still count towards the "All" totals
+    lot_axis = lots + [None] if long_df["Lot #"].isna().any() else list(lots)
+    heights = _axis(long_df["Tree Height (in)"])
+
+    dated = long_df[long_df["Year"].notna()]
+    counts = np.zeros((len(years), len(lot_axis), len(heights)), dtype=np.int64)
+    lot_positions = _position(lot_axis, [None if pd.isna(lot) else lot for lot in dated["Lot #"]])
+    np.add.at(
+        counts,
+        (_position(years, dated["Year"]), lot_positions, _position(heights, dated["Tree Height (in)"])),
+        dated["Count"].to_numpy(),
+    )
+
+    cells = rollup(long_df, ["Year", "Lot #", "Row #", "Tree Height (in)"])
+    index = FilterIndex(cells, ["Year", "Lot #"], "Tree Height (in)")
+
+    height_range = (int(heights[0]), int(heights[-1])) if heights else (0, 100)
+    return PlantingData(
+        long=long_df,
+        cells=cells,
+        index=index,
+        counts=counts,
+        years=years,
+        lots=lots,
+        lot_axis=lot_axis,
+        heights=heights,
+        height_range=height_range,
+    )
+
+
+def planting_dataset(workbook):
+    """Materialized Planting data of ``workbook``, built once per workbook."""
+    return workbook.derive("planting", lambda wb: build_planting(wb["Planting"]))
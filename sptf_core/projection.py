@@ -0,0 +1,166 @@
+"""Inventory growth projection over half-foot height classes.
+
+Replaces the ``calculations`` sheet that ``growth_archived.py`` recalculated
+through Excel/xlwings. Inventory is a vector of tree counts per height class
+and each projected year applies, in order:
+
+1. mortality: every class loses ``mortality`` of its trees
+2. growth: a transition matrix moves trees up by the yearly growth, spread
+   over neighbouring classes (the tallest class absorbs everything above it)
+3. purchases: ``purchases`` new trees enter at ``purchase_height`` (the old
+   ``B30`` "new trees per year" input)
+4. sales: the planned sales per height band are taken from each band in
+   proportion to its classes' stock, never more than the band holds
+
+All steps are matrix operations, and a leading batch axis on the starting
+inventory projects many scenarios at once.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from sptf_core.cube import HEIGHT_BIN_LABELS, HEIGHT_BINS, inventory_cube, rollup
+
+HEIGHT_STEP = 0.5
+MAX_HEIGHT = 30.0
+
+
+@dataclass(frozen=True)
+class GrowthModel:
+    growth_ft: float = 1.0
+    growth_spread_ft: float = 0.5
+    mortality: float = 0.02
+    purchases: int = 0
+    purchase_height: float = 1.0
+
+
+def height_classes(max_height=MAX_HEIGHT, step=HEIGHT_STEP):
+    return np.round(np.arange(step, max_height + step / 2, step), 6)
+
+
+def class_index(heights, values):
+    """Index of the class each height falls in, clipped to the grid."""
+    step = heights[1] - heights[0] if len(heights) > 1 else HEIGHT_STEP
+    index = np.rint((np.asarray(values, dtype=float) - heights[0]) / step).astype(int)
+    return np.clip(index, 0, len(heights) - 1)
+
+
+def transition_matrix(heights, growth_ft, spread_ft):
+    """``T[i, j]``: share of class ``i`` that is in class ``j`` a year later."""
+    n = len(heights)
+    step = heights[1] - heights[0] if n > 1 else HEIGHT_STEP
+    if spread_ft <= 0:
+        steps = np.array([max(int(round(growth_ft / step)), 0)])
+        weights = np.ones(1)
+    else:
+        steps = np.arange(0, int(np.ceil((growth_ft + 4 * spread_ft) / step)) + 1)
+        weights = np.exp(-0.5 * ((steps * step - growth_ft) / spread_ft) ** 2)
+        weights /= weights.sum()
+    matrix = np.zeros((n, n))
+    rows = np.repeat(np.arange(n), len(steps))
+    columns = np.minimum(rows + np.tile(steps, n), n - 1)
+    np.add.at(matrix, (rows, columns), np.tile(weights, n))
+    return matrix
+
+
+def band_matrix(heights, bands=HEIGHT_BINS):
+    """One-hot ``(classes, bands)`` membership, binned like ``pd.cut(..., right=True)``."""
+    membership = np.digitize(heights, bands[1:-1], right=True)
+    return np.eye(len(bands) - 1)[membership]
+
+
+def sell(stock, planned, membership):
+    """Trees taken from each class when ``planned`` trees are sold per band, in proportion to stock."""
+    band_stock = stock @ membership
+    planned = np.broadcast_to(planned, band_stock.shape)
+    # Bands holding less than a thousandth of a tree count as empty
+    share = np.divide(planned, band_stock, out=np.zeros(band_stock.shape), where=band_stock > 1e-3)
+    return stock * (np.minimum(share, 1.0) @ membership.T)
+
+
+@dataclass(frozen=True)
+class Projection:
+    """``inventory[t]`` is the stock after ``t`` projected years (``t = 0`` is the start); flows are per year."""
+
+    start_year: int
+    heights: np.ndarray
+    inventory: np.ndarray
+    lost: np.ndarray
+    purchased: np.ndarray
+    sold: np.ndarray
+
+    @property
+    def years(self):
+        return [self.start_year + t for t in range(len(self.inventory))]
+
+    def by_height(self, t=-1):
+        counts = np.rint(self.inventory[t]).astype(int)
+        keep = counts > 0
+        return pd.DataFrame({"Tree Height (ft)": self.heights[keep], "Count": counts[keep]})
+
+    def by_band(self):
+        """Long ``Year``/``Height``/``Count`` frame of stock per height band per year."""
+        counts = self.inventory @ band_matrix(self.heights)
+        frame = pd.DataFrame(np.rint(counts).astype(int), index=pd.Index(self.years, name="Year"), columns=pd.Index(HEIGHT_BIN_LABELS, name="Height"))
+        return frame.stack().rename("Count").reset_index()
+
+    def summary(self):
+        """One row per year: stock at year end and the year's flows (unbatched projections only)."""
+        zero = np.zeros(1)
+        return pd.DataFrame(
+            {
+                "Year": self.years,
+                "Trees": np.rint(self.inventory.sum(axis=-1)).astype(int),
+                "Purchased": np.rint(np.concatenate([zero, self.purchased.sum(axis=-1)])).astype(int),
+                "Lost": np.rint(np.concatenate([zero, self.lost.sum(axis=-1)])).astype(int),
+                "Sold": np.rint(np.concatenate([zero, self.sold.sum(axis=-1)])).astype(int),
+            }
+        )
+
+
+def project(initial, model, years, sales=None, heights=None, start_year=0, bands=HEIGHT_BINS):
+    """Project ``initial`` counts per height class forward ``years`` years.
+
+    ``initial`` has shape ``(..., classes)``; ``sales`` gives the trees to sell
+    each year per band of ``bands`` and broadcasts against the batch axes.
+    """
+    heights = height_classes() if heights is None else heights
+    stock = np.asarray(initial, dtype=float)
+    transition = transition_matrix(heights, model.growth_ft, model.growth_spread_ft)
+    membership = band_matrix(heights, bands)
+    planned = np.zeros(membership.shape[1]) if sales is None else np.asarray(sales, dtype=float)
+    purchase = np.zeros(len(heights))
+    purchase[class_index(heights, model.purchase_height)] = model.purchases
+
+    inventory, lost, purchased, sold = [stock], [], [], []
+    for _ in range(years):
+        dead = stock * model.mortality
+        stock = (stock - dead) @ transition + purchase
+        taken = sell(stock, planned, membership)
+        stock = stock - taken
+        inventory.append(stock)
+        lost.append(dead)
+        purchased.append(np.broadcast_to(purchase, stock.shape))
+        sold.append(taken)
+
+    shape = (0, *stock.shape)
+    return Projection(
+        start_year=start_year,
+        heights=heights,
+        inventory=np.stack(inventory),
+        lost=np.stack(lost) if lost else np.zeros(shape),
+        purchased=np.stack(purchased) if purchased else np.zeros(shape),
+        sold=np.stack(sold) if sold else np.zeros(shape),
+    )
+
+
+def starting_inventory(workbook, year, qualities=None, heights=None):
+    """Counts per height class for inventory ``year`` of ``workbook``."""
+    heights = height_classes() if heights is None else heights
+    cells = inventory_cube(workbook).select(qualities=qualities, years=[year])
+    totals = rollup(cells, "Tree Height (ft)")
+    counts = np.zeros(len(heights))
+    np.add.at(counts, class_index(heights, totals["Tree Height (ft)"].to_numpy(dtype=float)), totals["Count"].to_numpy(dtype=float))
+    return counts
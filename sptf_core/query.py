@@ -0,0 +1,179 @@
+"""Headless query API behind every page.
+
+Each page's sidebar state is captured in a typed filter object
+(``InventoryFilter``, ``SalesFilter``, ``PlantingFilter``); ``None`` means "no
+restriction". ``query_*`` resolves the filter against the workbook's
+precomputed datasets and returns a result object whose methods produce the
+same totals and chart frames the pages show. Nothing here imports Streamlit.
+"""
+
+from dataclasses import asdict, dataclass
+from functools import cached_property
+
+from sptf_core.cube import height_bin_totals, inventory_cube, rollup
+from sptf_core.figures import normalize_filters
+from sptf_core.planting import planting_dataset
+from sptf_core.projection import GrowthModel, project, starting_inventory
+from sptf_core.sales import sales_cube
+from sptf_core.schema import inventory_dataset
+
+
+class _Filter:
+    def key(self):
+        """Hashable, order-independent form of the filter for cache keys."""
+        return normalize_filters(**asdict(self))
+
+
+@dataclass(frozen=True)
+class InventoryFilter(_Filter):
+    lot: object = "All"
+    height_range: tuple = None
+    qualities: tuple = None
+    years: tuple = None
+
+
+@dataclass(frozen=True)
+class SalesFilter(_Filter):
+    years: tuple = None
+    height_range: tuple = None
+    qualities: tuple = None
+    customer: object = "All"
+
+
+@dataclass(frozen=True)
+class PlantingFilter(_Filter):
+    years: tuple = None
+    lot: object = "All"
+    height_range: tuple = None
+
+
+@dataclass(frozen=True)
+class ProjectionFilter(_Filter):
+    year: int = None
+    qualities: tuple = None
+    horizon: int = 5
+    growth_ft: float = GrowthModel.growth_ft
+    growth_spread_ft: float = GrowthModel.growth_spread_ft
+    mortality: float = GrowthModel.mortality
+    purchases: int = GrowthModel.purchases
+    purchase_height: float = GrowthModel.purchase_height
+    sales: tuple = None
+
+    def model(self):
+        return GrowthModel(self.growth_ft, self.growth_spread_ft, self.mortality, self.purchases, self.purchase_height)
+
+
+def _years(years):
+    return {str(int(year)): value for year, value in years.items()}
+
+
+@dataclass(frozen=True)
+class InventoryResult:
+    cells: object
+
+    def total(self):
+        return int(self.cells["Count"].sum())
+
+    def year_totals(self):
+        return self.cells.groupby("Inventory Year")["Count"].sum().sort_index()
+
+    def by_height(self):
+        return rollup(self.cells, ["Tree Height (ft)", "Inventory Year"])
+
+    def by_lot(self):
+        return rollup(self.cells, ["Lot", "Inventory Year"])
+
+    def by_row(self):
+        return rollup(self.cells, ["Row", "Inventory Year"])
+
+    def height_bins(self, year):
+        return height_bin_totals(self.cells[self.cells["Inventory Year"] == year])
+
+    def summary(self):
+        return rollup(self.cells, ["Quality", "Lot", "Row", "Tree Height (ft)"])
+
+    def to_dict(self):
+        return {"total": self.total(), "by_year": _years(self.year_totals().to_dict())}
+
+
+@dataclass(frozen=True)
+class SalesResult:
+    cells: object
+
+    def total(self, measure="Quantity"):
+        return self.cells[measure].sum()
+
+    def by_height(self, measure="Quantity"):
+        return rollup(self.cells, ["Tree Height (ft)", "Sales Year"], measure)
+
+    def by_customer(self, measure="Quantity"):
+        return rollup(self.cells, "Customer", measure)
+
+    def height_totals(self, measure="Quantity"):
+        return rollup(self.cells, "Tree Height (ft)", measure)
+
+    def to_dict(self):
+        by_year = self.cells.groupby("Sales Year")[["Quantity", "Revenue"]].sum()
+        return {
+            "trees": int(self.total("Quantity")),
+            "revenue": round(float(self.total("Revenue")), 2),
+            "by_year": {str(int(year)): {"trees": int(row["Quantity"]), "revenue": round(float(row["Revenue"]), 2)} for year, row in by_year.iterrows()},
+        }
+
+
+@dataclass(frozen=True)
+class PlantingResult:
+    planting: object
+    filter: PlantingFilter
+
+    @cached_property
+    def selection(self):
+        flt = self.filter
+        return self.planting.select(flt.years, flt.lot, flt.height_range)
+
+    def total(self):
+        return self.selection.total()
+
+    def height_by_year(self):
+        return self.selection.height_by_year()
+
+    def height_totals(self):
+        return self.selection.height_totals()
+
+    def lot_by_year(self):
+        return self.selection.lot_by_year()
+
+    def row_totals(self):
+        flt = self.filter
+        return self.planting.row_totals(flt.years, flt.lot, flt.height_range)
+
+    def to_dict(self):
+        selection = self.selection
+        by_year = selection.counts.sum(axis=(1, 2))
+        return {"total": selection.total(), "by_year": {str(year): int(count) for year, count in zip(selection.years, by_year)}}
+
+
+def query_inventory(workbook, flt=InventoryFilter()):
+    cells = inventory_cube(workbook).select(
+        lots=None if flt.lot == "All" else [flt.lot],
+        height_range=flt.height_range,
+        qualities=flt.qualities,
+        years=flt.years,
+    )
+    return InventoryResult(cells)
+
+
+def query_sales(workbook, flt=SalesFilter()):
+    cells = sales_cube(workbook).select(flt.years, flt.height_range, qualities=flt.qualities, customer=flt.customer)
+    return SalesResult(cells)
+
+
+def query_planting(workbook, flt=PlantingFilter()):
+    return PlantingResult(planting_dataset(workbook), flt)
+
+
+def query_projection(workbook, flt=ProjectionFilter()):
+    """Project the inventory of ``flt.year`` (the latest year when ``None``) ``flt.horizon`` years ahead."""
+    year = flt.year if flt.year is not None else inventory_dataset(workbook).years[-1]
+    initial = starting_inventory(workbook, year, flt.qualities)
+    return project(initial, flt.model(), flt.horizon, sales=flt.sales, start_year=year)
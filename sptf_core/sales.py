@@ -0,0 +1,61 @@
+"""Sales fact table and its (Sales Year, Tree Height, Customer, Quality) cube.
+
+Revenue is computed once per sale when the workbook is loaded, and Quantity
+and Revenue are summed into one cell per distinct (Sales Year, Tree Height
+(ft), Customer, Quality). Sales before 2023 were recorded without quality or
+customer detail; they are kept as an explicit ``UNKNOWN`` member of both
+dimensions rather than dropped, so totals always reconcile. Switching between
+"Tree Count" and "Revenue" only picks a different column of the same cells.
+"""
+
+from dataclasses import dataclass
+
+import pandas as pd
+
+from sptf_core.cube import rollup
+from sptf_core.index import FilterIndex
+from sptf_core.schema import sales_dataset
+
+UNKNOWN = "Unknown"
+SALES_CUBE_DIMENSIONS = ["Sales Year", "Tree Height (ft)", "Customer", "Quality"]
+SALES_MEASURES = ["Quantity", "Revenue"]
+
+
+def _with_unknown(column):
+    if UNKNOWN not in column.cat.categories:
+        column = column.cat.add_categories([UNKNOWN])
+    return column.fillna(UNKNOWN)
+
+
+@dataclass(frozen=True)
+class SalesCube:
+    facts: pd.DataFrame
+    cells: pd.DataFrame
+    index: FilterIndex
+
+    def select(self, years=None, height_range=None, qualities=None, customer="All"):
+        """Cells for the Historical Sales filters; ``None`` leaves a dimension unfiltered."""
+        isin = {}
+        if years is not None:
+            isin["Sales Year"] = years
+        if qualities is not None:
+            isin["Quality"] = qualities
+        if customer != "All":
+            isin["Customer"] = [customer]
+        return self.index.filter(isin, between=height_range)
+
+
+def build_sales_cube(sales):
+    facts = sales.frame.copy()
+    facts["Revenue"] = facts["Quantity"] * facts["Cost Per Tree"]
+    facts["Customer"] = _with_unknown(facts["Customer"])
+    facts["Quality"] = _with_unknown(facts["Quality"])
+
+    cells = rollup(facts, SALES_CUBE_DIMENSIONS, SALES_MEASURES)
+    index = FilterIndex(cells, ["Sales Year", "Quality", "Customer"], "Tree Height (ft)")
+    return SalesCube(facts=facts, cells=cells, index=index)
+
+
+def sales_cube(workbook):
+    """Sales cube of ``workbook``, built once per workbook."""
+    return workbook.derive("sales_cube", lambda wb: build_sales_cube(sales_dataset(wb)))
@@ -0,0 +1,272 @@
+"""Monte Carlo scenarios for the inventory projection.
+
+``history_distributions(workbook)`` estimates, from consecutive Inventory
+years and the Sales sheet, how fast trees grow, what share of a row is lost
+each year and how many trees sell per height band in a year.
+``run_scenarios`` then draws thousands of trials of a ``ScenarioPlan``:
+
+* each trial gets its own growth rate, drawn from the historical spread
+* mortality is drawn per trial and year
+* demand per band is a historical sales year, resampled per trial and year
+
+Trials are split across a process pool, each chunk with its own
+``SeedSequence`` child, and reduced to percentile bands of stock per height
+class per year. Results are cached per Inventory/Sales content, plan, trial
+count and seed.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from sptf_core.cube import HEIGHT_BIN_LABELS, HEIGHT_BINS
+from sptf_core.projection import GrowthModel, band_matrix, class_index, height_classes, sell, starting_inventory, transition_matrix
+from sptf_core.schema import inventory_dataset, sales_dataset
+
+PERCENTILES = (5, 25, 50, 75, 95)
+GROWTH_RESOLUTION = 0.1
+MIN_PARALLEL_TRIALS = 1000
+MAX_WORKERS = min(os.cpu_count() or 1, 8)
+
+
+@dataclass(frozen=True)
+class HistoryDistributions:
+    growth_ft: float
+    growth_sd_ft: float
+    mortality: float
+    mortality_sd: float
+    demand: tuple  # one tuple of trees sold per height band for each historical year
+
+
+@dataclass(frozen=True)
+class ScenarioPlan:
+    year: int = None
+    qualities: tuple = None
+    horizon: int = 5
+    purchases: int = 0
+    purchase_height: float = GrowthModel.purchase_height
+    growth_spread_ft: float = GrowthModel.growth_spread_ft
+    demand_scale: float = 1.0
+
+
+def _row_history(frame):
+    """Per (Lot, Row) count and count-weighted mean height for each inventory year."""
+    frame = frame.assign(weighted=frame["Tree Height (ft)"] * frame["Count"])
+    rows = frame.groupby(["Inventory Year", "Lot", "Row"], observed=True)[["Count", "weighted"]].sum()
+    rows = rows[rows["Count"] > 0]
+    rows["height"] = rows["weighted"] / rows["Count"]
+    return rows[["Count", "height"]]
+
+
+def build_history(inventory, sales):
+    defaults = GrowthModel()
+    rows = _row_history(inventory.frame)
+    sold = sales.frame.groupby("Sales Year", observed=True)["Quantity"].sum()
+    growth, growth_weights, losses, loss_weights = [], [], [], []
+    counted = set(rows.index.get_level_values("Inventory Year"))
+    for before, after in zip(inventory.years, inventory.years[1:]):
+        # A year whose counts are all zero has no rows to compare
+        if before not in counted or after not in counted:
+            continue
+        pair = rows.loc[before].join(rows.loc[after], lsuffix="_0", rsuffix="_1", how="inner")
+        if pair.empty:
+            continue
+        growth.append(((pair["height_1"] - pair["height_0"]) / (after - before)).to_numpy())
+        growth_weights.append(pair["Count_0"].to_numpy())
+        # Row declines include sales, so the farm-wide share sold is taken out first
+        sold_share = sold.reindex(range(before + 1, after + 1), fill_value=0).sum() / max(rows.loc[before]["Count"].sum(), 1)
+        loss = 1 - pair["Count_1"] / pair["Count_0"] - sold_share
+        losses.append(np.clip(loss.to_numpy(), 0, 1) / (after - before))
+        loss_weights.append(pair["Count_0"].to_numpy())
+
+    def weighted_stats(samples, weights, mean_default, sd_default):
+        if not samples:
+            return mean_default, sd_default
+        values, weights = np.concatenate(samples), np.concatenate(weights)
+        mean = np.average(values, weights=weights)
+        return float(mean), float(np.sqrt(np.average((values - mean) ** 2, weights=weights)))
+
+    growth_ft, growth_sd_ft = weighted_stats(growth, growth_weights, defaults.growth_ft, 0.0)
+    mortality, mortality_sd = weighted_stats(losses, loss_weights, defaults.mortality, 0.0)
+
+    by_band = pd.cut(sales.frame["Tree Height (ft)"], bins=HEIGHT_BINS, labels=HEIGHT_BIN_LABELS)
+    demand = sales.frame.groupby(["Sales Year", by_band], observed=False)["Quantity"].sum().unstack(fill_value=0)
+    demand = demand.reindex(columns=HEIGHT_BIN_LABELS, fill_value=0)
+    return HistoryDistributions(
+        growth_ft=max(growth_ft, 0.0),
+        growth_sd_ft=growth_sd_ft,
+        mortality=min(max(mortality, 0.0), 1.0),
+        mortality_sd=mortality_sd,
+        demand=tuple(tuple(float(value) for value in row) for row in demand.to_numpy()) or (tuple(0.0 for _ in HEIGHT_BIN_LABELS),),
+    )
+
+
+def history_distributions(workbook):
+    """Growth, loss and demand distributions of ``workbook``, built once per workbook."""
+    return workbook.derive("scenario_history", lambda wb: build_history(inventory_dataset(wb), sales_dataset(wb)))
+
+
+def run_trials(initial, heights, history, plan, trials, seed):
+    """Run ``trials`` trials in this process; returns stock ``(years + 1, trials, classes)`` and sold ``(years, trials)``."""
+    rng = np.random.default_rng(seed)
+    growth = np.clip(rng.normal(history.growth_ft, history.growth_sd_ft, trials), 0, None)
+    levels, trial_level = np.unique(np.rint(growth / GROWTH_RESOLUTION).astype(int), return_inverse=True)
+    transitions = [transition_matrix(heights, level * GROWTH_RESOLUTION, plan.growth_spread_ft) for level in levels]
+    groups = [np.flatnonzero(trial_level == k) for k in range(len(levels))]
+    membership = band_matrix(heights)
+    demand = np.asarray(history.demand) * plan.demand_scale
+    purchase = np.zeros(len(heights))
+    purchase[class_index(heights, plan.purchase_height)] = plan.purchases
+
+    stock = np.repeat(np.asarray(initial, dtype=float)[None, :], trials, axis=0)
+    stocks = np.empty((plan.horizon + 1, trials, len(heights)), dtype=np.float32)
+    sold = np.empty((plan.horizon, trials), dtype=np.float32)
+    stocks[0] = stock
+    for t in range(plan.horizon):
+        mortality = np.clip(rng.normal(history.mortality, history.mortality_sd, trials), 0, 1)
+        stock = stock * (1 - mortality)[:, None]
+        for members, transition in zip(groups, transitions):
+            stock[members] = stock[members] @ transition
+        stock += purchase
+        taken = sell(stock, demand[rng.integers(len(demand), size=trials)], membership)
+        stock -= taken
+        stocks[t + 1] = stock
+        sold[t] = taken.sum(axis=1)
+    return stocks, sold
+
+
+@dataclass(frozen=True)
+class ScenarioResult:
+    """Percentile bands over trials; the leading axis of each array follows ``percentiles``."""
+
+    start_year: int
+    heights: np.ndarray
+    percentiles: tuple
+    trials: int
+    history: HistoryDistributions
+    stock: np.ndarray  # (percentiles, years + 1, classes)
+    total: np.ndarray  # (percentiles, years + 1)
+    band_total: np.ndarray  # (percentiles, years + 1, bands)
+    sold: np.ndarray  # (percentiles, years)
+
+    @property
+    def years(self):
+        return [self.start_year + t for t in range(self.total.shape[1])]
+
+    def totals(self):
+        """``Year`` plus one column per percentile of total stock."""
+        frame = pd.DataFrame(self.total.T.round(), columns=[f"p{p}" for p in self.percentiles]).astype(int)
+        frame.insert(0, "Year", self.years)
+        return frame
+
+    def bands(self, t=-1):
+        """Percentiles of stock per height band in year ``t``."""
+        frame = pd.DataFrame(self.band_total[:, t, :].T.round(), columns=[f"p{p}" for p in self.percentiles]).astype(int)
+        frame.insert(0, "Height", HEIGHT_BIN_LABELS)
+        return frame
+
+
+def _reduce(start_year, heights, history, stocks, sold, percentiles):
+    membership = band_matrix(heights)
+    return ScenarioResult(
+        start_year=start_year,
+        heights=heights,
+        percentiles=percentiles,
+        trials=stocks.shape[1],
+        history=history,
+        stock=np.percentile(stocks, percentiles, axis=1),
+        total=np.percentile(stocks.sum(axis=2), percentiles, axis=1),
+        band_total=np.percentile(stocks @ membership, percentiles, axis=1),
+        sold=np.percentile(sold, percentiles, axis=1),
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    """Process pool shared by every session; spawned rather than forked, since the server is multithreaded."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=get_context("spawn"))
+        return _pool
+
+
+def simulate(initial, heights, history, plan, trials=2000, seed=0, workers=None, start_year=0, percentiles=PERCENTILES):
+    """Run ``trials`` trials of ``plan``, split across ``workers`` processes, and reduce them to percentiles."""
+    workers = MAX_WORKERS if workers is None else max(1, workers)
+    chunks = workers if trials >= MIN_PARALLEL_TRIALS else 1
+    seeds = np.random.SeedSequence(seed).spawn(chunks)
+    sizes = [len(part) for part in np.array_split(np.arange(trials), chunks)]
+    if chunks == 1:
+        parts = [run_trials(initial, heights, history, plan, trials, seeds[0])]
+    else:
+        pool = _executor()
+        futures = [pool.submit(run_trials, initial, heights, history, plan, size, child) for size, child in zip(sizes, seeds)]
+        parts = [future.result() for future in futures]
+    stocks = np.concatenate([part[0] for part in parts], axis=1)
+    sold = np.concatenate([part[1] for part in parts], axis=1)
+    return _reduce(start_year, heights, history, stocks, sold, percentiles)
+
+
+class ScenarioCache:
+    """Bounded LRU of scenario results; concurrent requests for the same key run it once."""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._pending = {}
+
+    def get_or_run(self, cache_key, run):
+        with self._lock:
+            if cache_key in self._results:
+                self._results.move_to_end(cache_key)
+                return self._results[cache_key]
+            key_lock = self._pending.setdefault(cache_key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if cache_key in self._results:
+                    return self._results[cache_key]
+            try:
+                result = run()
+                with self._lock:
+                    self._results[cache_key] = result
+                    while len(self._results) > self.maxsize:
+                        self._results.popitem(last=False)
+            finally:
+                # A failed run is not cached; the next request runs it again
+                with self._lock:
+                    self._pending.pop(cache_key, None)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
+
+
+scenario_cache = ScenarioCache()
+
+
+def run_scenarios(workbook, plan=ScenarioPlan(), trials=2000, seed=0, workers=None, cache=scenario_cache):
+    """Monte Carlo bands for ``plan`` on ``workbook``, cached per Inventory/Sales content, plan, trials and seed."""
+    year = plan.year if plan.year is not None else inventory_dataset(workbook).years[-1]
+
+    def run():
+        heights = height_classes()
+        initial = starting_inventory(workbook, year, plan.qualities, heights)
+        return simulate(initial, heights, history_distributions(workbook), plan, trials, seed, workers, start_year=year)
+
+    return cache.get_or_run((workbook.sheet_version("Inventory", "Sales"), plan, year, trials, seed), run)
@@ -0,0 +1,112 @@
+"""Load-time normalization of the Inventory and Sales sheets.
+
+Each sheet is converted once per workbook into compact dtypes (ordered
+categoricals for Lot/Quality/Customer, the smallest integer type for rows,
+years and counts), and the option lists the sidebar widgets need are computed
+at the same time so reruns never scan the frame for them.
+"""
+
+from dataclasses import dataclass
+
+import pandas as pd
+
+QUALITY_ORDER = ["A", "B", "Cut"]
+SALES_QUALITY_ORDER = ["A", "B"]
+INVENTORY_COLUMNS = ["Lot", "Row", "Quality", "Tree Height (ft)", "Count", "Inventory Year"]
+SALES_COLUMNS = ["Sales Year", "Tree Height (ft)", "Quality", "Customer", "Quantity", "Cost Per Tree"]
+
+
+def lot_sort_key(lot):
+    return int(str(lot))
+
+
+def small_int(series, min_bits=8):
+    """Downcast an integral column to the smallest integer dtype of at least ``min_bits`` (nullable if it has gaps)."""
+    numeric = pd.to_numeric(series, errors="coerce")
+    present = numeric.dropna()
+    if len(present) != series.notna().sum() or (present % 1 != 0).any():
+        return series
+    if len(present) == 0:
+        return numeric
+    bits = max(pd.to_numeric(present.astype("int64"), downcast="integer").dtype.itemsize * 8, min_bits)
+    if len(present) != len(numeric):
+        return numeric.astype(f"Int{bits}")
+    return numeric.astype(f"int{bits}")
+
+
+def ordered_categorical(series, order=None, key=None):
+    """Categorical with ``order`` first, any other values after it (sorted with ``key``)."""
+    present = pd.unique(series.dropna())
+    order = [value for value in (order or []) if value in set(present)]
+    extra = sorted((value for value in present if value not in set(order)), key=key)
+    return pd.Categorical(series, categories=order + extra, ordered=True)
+
+
+def _options(values):
+    return [value.item() if hasattr(value, "item") else value for value in values]
+
+
+@dataclass(frozen=True)
+class InventoryData:
+    frame: pd.DataFrame
+    lots: list
+    qualities: list
+    years: list
+    height_range: tuple
+
+
+@dataclass(frozen=True)
+class SalesData:
+    frame: pd.DataFrame
+    years: list
+    customers: list
+    qualities: list
+    height_range: tuple
+
+
+def _height_range(frame):
+    heights = frame["Tree Height (ft)"]
+    return (float(heights.min()), float(heights.max()))
+
+
+def normalize_inventory(frame):
+    frame = frame.copy()
+    frame["Lot"] = ordered_categorical(frame["Lot"], key=lot_sort_key)
+    frame["Row"] = small_int(frame["Row"])
+    frame["Quality"] = ordered_categorical(frame["Quality"], QUALITY_ORDER)
+    frame["Count"] = small_int(frame["Count"], min_bits=32)
+    frame["Inventory Year"] = small_int(frame["Inventory Year"])
+
+    return InventoryData(
+        frame=frame,
+        lots=_options(frame["Lot"].cat.categories),
+        qualities=[q for q in QUALITY_ORDER if q in set(frame["Quality"].cat.categories)],
+        years=sorted(_options(frame["Inventory Year"].dropna().unique())),
+        height_range=_height_range(frame),
+    )
+
+
+def normalize_sales(frame):
+    frame = frame.copy()
+    frame["Sales Year"] = small_int(frame["Sales Year"])
+    frame["Quality"] = ordered_categorical(frame["Quality"], SALES_QUALITY_ORDER)
+    frame["Customer"] = ordered_categorical(frame["Customer"], key=str)
+    frame["Quantity"] = small_int(frame["Quantity"], min_bits=32)
+
+    return SalesData(
+        frame=frame,
+        years=sorted(_options(frame["Sales Year"].dropna().unique())),
+        customers=_options(frame["Customer"].cat.categories),
+        qualities=list(SALES_QUALITY_ORDER),
+        height_range=_height_range(frame),
+    )
+
+
+def inventory_dataset(workbook):
+    """Normalized Inventory sheet of ``workbook``, built once per workbook."""
+    return workbook.derive("inventory", lambda wb: normalize_inventory(wb.sheet("Inventory", columns=INVENTORY_COLUMNS)))
+
+
+def sales_dataset(workbook):
+    """Normalized Sales sheet of ``workbook``, built once per workbook."""
+    return workbook.derive("sales", lambda wb: normalize_sales(wb.sheet("Sales", columns=SALES_COLUMNS)))
@@ -0,0 +1,273 @@
+"""Sharing parsed workbook sheets between server processes.
+
+When several Streamlit servers run behind a proxy, each one would otherwise
+decrypt the workbook and hold its own copy of every sheet. With
+``SPTF_SHARED=1`` the first process to open a version of the workbook parses
+it and publishes each sheet as an Arrow IPC stream in a named shared-memory
+segment. Every process, the publisher included, then maps those segments
+read-only and builds its DataFrames on top of them: numeric columns without
+missing values and string columns stay in the segment instead of being
+copied.
+
+Each segment starts with a version header naming the generation and the
+source workbook (SHA-256 of the encrypted file), so a process never reads a
+segment left over from another version. ``.sptf_cache/<workbook>.shared.json``
+is the manifest: the current generation with its segments, sheet hashes and a
+password check value, and the number of references each process holds on
+every generation. Publishing a new generation unlinks older ones that no
+live process references; the last process to release a stale generation
+unlinks it. Manifest updates are serialized with ``flock``, so a process that
+opens the workbook while another is publishing it waits and then attaches.
+
+Needs ``pyarrow`` and a POSIX system; all server processes must share the
+working directory. Segments outlive the servers so a restarted worker can
+attach again; ``SharedStore(path).clear()`` removes them once every server
+is stopped.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import struct
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from sptf_core.snapshot import SNAPSHOT_DIR, frame_stream, pa, table_frame
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+USE_SHARED = os.environ.get("SPTF_SHARED", "0") == "1"
+
+_MAGIC = b"SPTFSHM1\n"
+_HEADER_LEN = struct.Struct("<I")
+# Arrow buffers are 64-byte aligned within the stream; keep the stream itself aligned too
+_ALIGNMENT = 64
+
+
+def shared_available():
+    return USE_SHARED and pa is not None and fcntl is not None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _open_segment(name, size=0):
+    """Create (``size`` > 0) or open segment ``name``.
+
+    Segment lifetime is managed through the manifest, so the segment is kept
+    off the resource tracker, which would otherwise unlink it when this
+    process exits while other processes still use it.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=size > 0, size=size, track=False)
+    segment = shared_memory.SharedMemory(name=name, create=size > 0, size=size)
+    # The tracker is given the POSIX name, which has a leading slash
+    resource_tracker.unregister(f"/{segment.name}", "shared_memory")
+    return segment
+
+
+def _unlink(name):
+    try:
+        segment = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+def _data_offset(header_len):
+    end = len(_MAGIC) + _HEADER_LEN.size + header_len
+    return -(-end // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_segment(name, frame, header):
+    """Publish ``frame`` in a new segment ``name`` behind ``header``; replaces a leftover segment of that name."""
+    stream, columns = frame_stream(frame)
+    header = dict(header, columns=columns, length=stream.size)
+    header_bytes = json.dumps(header).encode("utf-8")
+    start = _data_offset(len(header_bytes))
+    _unlink(name)
+    segment = _open_segment(name, size=start + max(stream.size, 1))
+    try:
+        buffer = segment.buf
+        buffer[: len(_MAGIC)] = _MAGIC
+        _HEADER_LEN.pack_into(buffer, len(_MAGIC), len(header_bytes))
+        offset = len(_MAGIC) + _HEADER_LEN.size
+        buffer[offset : offset + len(header_bytes)] = header_bytes
+        buffer[start : start + stream.size] = memoryview(stream).cast("B")
+        del buffer
+    finally:
+        segment.close()
+
+
+def _segment_buffer(segment, start, length):
+    """``length`` bytes of ``segment`` from ``start`` as an Arrow buffer that keeps ``segment`` open."""
+    # A temporary export to find the mapping's address; the buffer then holds the segment itself
+    address = np.frombuffer(segment.buf, dtype=np.uint8).ctypes.data
+    return pa.foreign_buffer(address + start, length, base=segment)
+
+
+def read_segment(name, accept):
+    """Map segment ``name`` and return its frame, or None if ``accept(header)`` rejects it.
+
+    The frame's zero-copy columns point into the mapping, which stays mapped
+    for as long as any of them is alive, even after the segment is unlinked.
+    """
+    segment = _open_segment(name)
+    buffer = segment.buf
+    if bytes(buffer[: len(_MAGIC)]) != _MAGIC:
+        segment.close()
+        return None
+    (header_len,) = _HEADER_LEN.unpack_from(buffer, len(_MAGIC))
+    offset = len(_MAGIC) + _HEADER_LEN.size
+    header = json.loads(bytes(buffer[offset : offset + header_len]))
+    if not accept(header):
+        segment.close()
+        return None
+    del buffer
+    data = _segment_buffer(segment, _data_offset(header_len), header["length"])
+    table = pa.ipc.open_stream(data).read_all()
+    return table_frame(header, table, split_blocks=True)
+
+
+class SharedDataset:
+    """The frames of one published generation, as mapped by this process."""
+
+    def __init__(self, store, entry, frames):
+        self.store = store
+        self.generation = entry["generation"]
+        self.source = entry["source"]
+        self.sheet_names = entry["sheet_names"]
+        self.sheet_hashes = entry["sheet_hashes"]
+        self.frames = frames
+        self._released = False
+
+    def release(self):
+        """Drop this process's reference; the frames stay usable until they are garbage collected."""
+        if not self._released:
+            self._released = True
+            self.store.release(self.generation)
+
+
+class SharedStore:
+    """Manifest and segments of the shared copies of one workbook."""
+
+    def __init__(self, path, root=None):
+        path = os.path.abspath(path)
+        root = root or os.path.join(os.path.dirname(path), SNAPSHOT_DIR)
+        self.path = path
+        self.manifest_path = os.path.join(root, f"{os.path.basename(path)}.shared.json")
+        # POSIX allows 31-character names on some systems; the path hash keeps workbooks apart
+        self._prefix = "sptf" + hashlib.sha256(path.encode("utf-8")).hexdigest()[:10]
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Hold the store lock and yield the manifest, which is written back when the block succeeds."""
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with open(f"{self.manifest_path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.manifest_path) as file:
+                        manifest = json.load(file)
+                except (FileNotFoundError, ValueError):
+                    manifest = {"generation": 0, "current": None, "generations": {}}
+                yield manifest
+                temp = f"{self.manifest_path}.{os.getpid()}.tmp"
+                with open(temp, "w") as file:
+                    json.dump(manifest, file, indent=1)
+                os.replace(temp, self.manifest_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def current(self, manifest, source):
+        """The manifest entry of the current generation if it was published from ``source``."""
+        entry = manifest["current"]
+        return entry if entry is not None and entry["source"] == source else None
+
+    def publish(self, manifest, source, frames, sheet_hashes, check=None):
+        """Write ``frames`` as a new generation and make it current; returns its manifest entry."""
+        generation = manifest["generation"] + 1
+        segments = {name: f"{self._prefix}g{generation}s{index}" for index, name in enumerate(frames)}
+        try:
+            for name, frame in frames.items():
+                write_segment(segments[name], frame, {"generation": generation, "source": source, "sheet": name})
+        except BaseException:
+            for segment in segments.values():
+                _unlink(segment)
+            raise
+        entry = {
+            "generation": generation,
+            "source": source,
+            "check": check,
+            "sheet_names": list(frames),
+            "sheet_hashes": sheet_hashes,
+            "segments": segments,
+        }
+        manifest["generation"] = generation
+        manifest["current"] = entry
+        manifest["generations"][str(generation)] = {"segments": list(segments.values()), "references": {}}
+        self._collect(manifest)
+        return entry
+
+    def attach(self, manifest, entry):
+        """Map every sheet of ``entry`` and take a reference on its generation for this process."""
+        generation = entry["generation"]
+
+        def accept(header):
+            return header["generation"] == generation and header["source"] == entry["source"]
+
+        frames = {}
+        for name, segment in entry["segments"].items():
+            frame = read_segment(segment, accept)
+            if frame is None:
+                raise OSError(f"shared segment {segment} does not hold generation {generation}")
+            frames[name] = frame
+        references = manifest["generations"][str(generation)]["references"]
+        pid = str(os.getpid())
+        references[pid] = references.get(pid, 0) + 1
+        return SharedDataset(self, entry, frames)
+
+    def release(self, generation):
+        with self.transaction() as manifest:
+            state = manifest["generations"].get(str(generation))
+            if state is not None:
+                pid = str(os.getpid())
+                count = state["references"].get(pid, 0) - 1
+                if count > 0:
+                    state["references"][pid] = count
+                else:
+                    state["references"].pop(pid, None)
+            self._collect(manifest)
+
+    def _collect(self, manifest):
+        """Unlink every generation other than the current one that no live process references."""
+        current = manifest["current"]["generation"] if manifest["current"] is not None else None
+        for generation, state in list(manifest["generations"].items()):
+            state["references"] = {pid: count for pid, count in state["references"].items() if _alive(int(pid))}
+            if int(generation) != current and not state["references"]:
+                for segment in state["segments"]:
+                    _unlink(segment)
+                del manifest["generations"][generation]
+
+    def clear(self):
+        """Unlink every segment and forget the manifest."""
+        with self.transaction() as manifest:
+            for state in manifest["generations"].values():
+                for segment in state["segments"]:
+                    _unlink(segment)
+            manifest.update(current=None, generations={})
+
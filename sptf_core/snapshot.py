@@ -0,0 +1,170 @@
+"""Encrypted columnar snapshots of workbook sheets.
+
+Parsing XLSX through openpyxl is the slowest part of a cold start. The first
+time a sheet is parsed it is also written as an Arrow IPC stream to
+``.sptf_cache/<workbook>.<sheet>.snapshot`` next to the workbook, and later
+cold starts read that file instead of the spreadsheet.
+
+Each snapshot is sealed with AES-GCM under a key derived (HKDF) from the
+workbook's own secret key, so it is as protected at rest as the workbook. The
+header records the source workbook's mtime, size and SHA-256; a snapshot is
+ignored and rewritten as soon as any of them change. Files are memory-mapped,
+decrypted in one pass and handed to Arrow without re-parsing.
+
+Snapshots need ``pyarrow``; without it, or with ``SPTF_SNAPSHOT=0`` in the
+environment, the stage is skipped.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+SNAPSHOT_DIR = ".sptf_cache"
+USE_SNAPSHOT = os.environ.get("SPTF_SNAPSHOT", "1") != "0"
+
+_MAGIC = b"SPTFSNAP2\n"
+_HEADER_LEN = struct.Struct("<I")
+
+
+def snapshot_available():
+    return USE_SNAPSHOT and pa is not None
+
+
+def snapshot_path(path, sheet):
+    path = os.path.abspath(path)
+    safe_sheet = re.sub(r"[^A-Za-z0-9_-]", "_", sheet)
+    return os.path.join(os.path.dirname(path), SNAPSHOT_DIR, f"{os.path.basename(path)}.{safe_sheet}.snapshot")
+
+
+def source_fingerprint(stat, content):
+    """Fingerprint of a workbook from its ``os.stat`` result and raw bytes."""
+    return {"mtime_ns": stat.st_mtime_ns, "size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+
+
+def _snapshot_key(secret_key, fingerprint):
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=bytes.fromhex(fingerprint["sha256"]),
+        info=b"sptf-snapshot-v2",
+    )
+    return hkdf.derive(secret_key)
+
+
+def read_sealed(target, key, accept):
+    """Open the sealed Arrow file at ``target`` and return ``(header, table)``, or None.
+
+    ``accept(header)`` is checked before anything is decrypted; the header is
+    authenticated as associated data.
+    """
+    try:
+        with open(target, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if view[: len(_MAGIC)] != _MAGIC:
+                return None
+            start = len(_MAGIC) + _HEADER_LEN.size
+            (header_len,) = _HEADER_LEN.unpack_from(view, len(_MAGIC))
+            header_bytes = bytes(view[start : start + header_len])
+            header = json.loads(header_bytes)
+            if not accept(header):
+                return None
+
+            aead = AESGCM(key)
+            with memoryview(view) as data, data[start + header_len :] as sealed:
+                payload = aead.decrypt(bytes.fromhex(header["nonce"]), sealed, header_bytes)
+    except (OSError, ValueError, KeyError, InvalidTag):
+        return None
+    return header, pa.ipc.open_stream(pa.py_buffer(payload)).read_all()
+
+
+def table_frame(header, table, columns=None, split_blocks=False):
+    """Convert ``table`` to pandas under the original column names stored in ``header``.
+
+    ``split_blocks`` keeps one block per column, which lets Arrow hand over
+    numeric columns without copying them.
+    """
+    names = header["columns"]
+    if columns is not None:
+        positions = [names.index(column) for column in columns]
+        table = table.select(positions)
+        names = [names[position] for position in positions]
+    frame = table.to_pandas(split_blocks=split_blocks)
+    frame.columns = names
+    return frame
+
+
+def frame_stream(frame):
+    """Serialize ``frame`` as an Arrow IPC stream; returns ``(pyarrow.Buffer, column names)``.
+
+    The column names go in the header for ``table_frame``, since Arrow only
+    keeps them as strings.
+    """
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    columns = [column if isinstance(column, (int, float)) else str(column) for column in frame.columns]
+    return sink.getvalue(), columns
+
+
+def write_sealed(target, frame, key, header):
+    """Seal ``frame`` as Arrow under ``key`` and atomically write it to ``target``; returns False on failure."""
+    try:
+        stream, columns = frame_stream(frame)
+        nonce = os.urandom(12)
+        header = dict(header, nonce=nonce.hex(), columns=columns)
+        header_bytes = json.dumps(header).encode("utf-8")
+        sealed = AESGCM(key).encrypt(nonce, stream.to_pybytes(), header_bytes)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp = f"{target}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "wb") as file:
+                file.write(_MAGIC)
+                file.write(_HEADER_LEN.pack(len(header_bytes)))
+                file.write(header_bytes)
+                file.write(sealed)
+            os.replace(temp, target)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        return True
+    except (OSError, ValueError, TypeError, pa.ArrowException):
+        return False
+
+
+def load_sheet_snapshot(path, sheet, secret_key, fingerprint, columns=None):
+    """Return ``sheet`` from a valid snapshot of the workbook at ``path``, or None.
+
+    ``columns`` limits the columns converted to pandas.
+    """
+    if not snapshot_available():
+        return None
+    opened = read_sealed(
+        snapshot_path(path, sheet),
+        _snapshot_key(secret_key, fingerprint),
+        lambda header: header["source"] == fingerprint and header["sheet"] == sheet,
+    )
+    if opened is None:
+        return None
+    return table_frame(*opened, columns=columns)
+
+
+def write_sheet_snapshot(path, sheet, frame, secret_key, fingerprint):
+    """Write a snapshot of ``frame``; returns False if it could not be written."""
+    if not snapshot_available():
+        return False
+    header = {"source": fingerprint, "sheet": sheet}
+    return write_sealed(snapshot_path(path, sheet), frame, _snapshot_key(secret_key, fingerprint), header)
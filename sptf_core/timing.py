@@ -0,0 +1,179 @@
+"""Per-rerun timing spans.
+
+A ``Rerun`` collects named, nested spans for one execution of the app
+script. ``span(name)`` records into the rerun active in the current thread
+(Streamlit runs each session's script in its own thread) and returns a shared
+no-op context manager when none is active, so instrumented code costs one
+context-variable lookup while timing is off.
+
+Finished reruns are emitted as JSON lines (to the ``sptf.timing`` logger, and
+appended to ``SPTF_TIMING_LOG`` when set) and rolled up per page in
+``timing_stats``.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+ENABLED = os.environ.get("SPTF_TIMING", "0") != "0"
+LOG_PATH = os.environ.get("SPTF_TIMING_LOG")
+
+logger = logging.getLogger("sptf.timing")
+
+_active = ContextVar("sptf_timing_rerun", default=None)
+_log_lock = threading.Lock()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("rerun", "name", "start", "depth")
+
+    def __init__(self, rerun, name):
+        self.rerun = rerun
+        self.name = name
+
+    def __enter__(self):
+        self.depth = self.rerun._depth
+        self.rerun._depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.rerun._depth -= 1
+        self.rerun.spans.append(
+            {
+                "name": self.name,
+                "depth": self.depth,
+                "start_ms": (self.start - self.rerun.started) * 1000,
+                "ms": (end - self.start) * 1000,
+            }
+        )
+        return False
+
+
+class Rerun:
+    """Spans of one script run, in the order they finished."""
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.spans = []
+        self.total_ms = None
+        self._depth = 0
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def to_dict(self):
+        return {
+            "ts": round(self.timestamp, 3),
+            "page": self.page,
+            "total_ms": round(self.total_ms, 3),
+            "spans": [dict(span, start_ms=round(span["start_ms"], 3), ms=round(span["ms"], 3)) for span in sorted(self.spans, key=lambda s: s["start_ms"])],
+        }
+
+
+class TimingStats:
+    """Rolling window of the last ``window`` durations per page and span name."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = defaultdict(lambda: defaultdict(lambda: deque(maxlen=self.window)))
+        self._lock = threading.Lock()
+
+    def record(self, rerun):
+        totals = defaultdict(float)
+        for span in rerun.spans:
+            totals[span["name"]] += span["ms"]
+        with self._lock:
+            page = self._samples[rerun.page]
+            page["rerun"].append(rerun.total_ms)
+            for name, ms in totals.items():
+                page[name].append(ms)
+
+    def summary(self, page):
+        """``[{"span", "n", "p50_ms", "p95_ms"}]`` for ``page``, slowest p95 first."""
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.get(page, {}).items()}
+        rows = []
+        for name, values in samples.items():
+            p50, p95 = np.percentile(values, [50, 95])
+            rows.append({"span": name, "n": len(values), "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2)})
+        return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+    def pages(self):
+        with self._lock:
+            return list(self._samples)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+timing_stats = TimingStats()
+
+
+def span(name):
+    """Time the enclosed block as ``name`` in the active rerun, if any."""
+    rerun = _active.get()
+    if rerun is None:
+        return _NULL_SPAN
+    return rerun.span(name)
+
+
+def reset():
+    """Drop any rerun left active in this thread by a script run that stopped before ``end()``."""
+    _active.set(None)
+
+
+def begin(page):
+    """Start collecting spans for a rerun of ``page`` in the current thread."""
+    rerun = Rerun(page)
+    _active.set(rerun)
+    return rerun
+
+
+def end(rerun, stats=timing_stats):
+    """Stop collecting, roll ``rerun`` into ``stats`` and emit it as a JSON line."""
+    rerun.total_ms = (time.perf_counter() - rerun.started) * 1000
+    if _active.get() is rerun:
+        _active.set(None)
+    stats.record(rerun)
+    line = json.dumps(rerun.to_dict())
+    logger.info(line)
+    if LOG_PATH:
+        with _log_lock, open(LOG_PATH, "a") as log:
+            log.write(line + "\n")
+    return rerun
+
+
+@contextmanager
+def recording(page, enabled=True):
+    """Collect the enclosed block as its own rerun of ``page`` when ``enabled``."""
+    if not enabled or _active.get() is not None:
+        yield None
+        return
+    rerun = begin(page)
+    try:
+        yield rerun
+    finally:
+        end(rerun)
@@ -0,0 +1,127 @@
+"""Unlocking the workbook on a worker thread.
+
+``start_unlock(password)`` returns at once with an ``UnlockJob``. The job
+opens the workbook through ``workbook_cache`` (which checks the password and
+reads the sheet list) on a worker thread, so the UI can show the navigation
+as soon as the password is accepted. A sheet is only parsed once a page asks
+for it: ``job.ready(sheets)`` starts a loader thread per sheet not yet
+loaded, which builds that sheet's page dataset through ``LazyWorkbook.derive``
+(so concurrent requests build it once), and each page renders as soon as its
+own sheets are in. A wrong password or an unreadable file ends the job with
+``error`` set. Jobs are shared by every session unlocking the same file with
+the same password; a failed job is forgotten once it ends.
+"""
+
+import os
+import threading
+
+from sptf_core import timing
+from sptf_core.crypto import password_digest
+from sptf_core.cube import inventory_cube
+from sptf_core.planting import planting_dataset
+from sptf_core.sales import sales_cube
+from sptf_core.workbook import WORKBOOK_PATH, workbook_cache
+
+# The dataset the pages build from each sheet
+SHEET_DATASETS = {"Inventory": inventory_cube, "Sales": sales_cube, "Planting": planting_dataset}
+
+
+class UnlockJob:
+    def __init__(self, path, password, record=False):
+        self.path = path
+        self.handle = None
+        self.error = None
+        self.sheet_errors = {}
+        self._record = record
+        self._names = set()
+        self._loading = {}
+        self._ready = set()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(password,), name="sptf-unlock", daemon=True)
+        self._thread.start()
+
+    def _run(self, password):
+        try:
+            with timing.recording("Unlock", enabled=self._record), timing.span("load_data"):
+                handle = workbook_cache.get(self.path, password)
+                self._names = set(handle.current.sheet_names())
+            self.handle = handle
+        except Exception as exc:
+            self.error = exc
+            _forget(self)
+        finally:
+            self._done.set()
+
+    def _load(self, name):
+        try:
+            with timing.recording(f"Unlock {name}", enabled=self._record):
+                SHEET_DATASETS[name](self.handle.current)
+        except Exception as exc:  # the page reports it when it reads the sheet itself
+            self.sheet_errors[name] = exc
+        finally:
+            self._ready.add(name)
+
+    def load(self, sheets):
+        """Start loading each of ``sheets`` that is not loaded or loading yet."""
+        with self._lock:
+            for name in sheets:
+                if name in self._loading:
+                    continue
+                if name not in SHEET_DATASETS or name not in self._names:
+                    # Nothing to build; the page reports a missing sheet itself
+                    self._loading[name] = None
+                    self._ready.add(name)
+                    continue
+                thread = self._loading[name] = threading.Thread(target=self._load, args=(name,), name=f"sptf-unlock-{name}", daemon=True)
+                thread.start()
+
+    @property
+    def done(self):
+        """True once the password check has finished, accepted or not."""
+        return self._done.is_set()
+
+    @property
+    def unlocked(self):
+        """True once the password has been accepted."""
+        return self.handle is not None
+
+    def ready(self, sheets=()):
+        """True when the password was accepted and every sheet in ``sheets`` has been loaded; starts loading them."""
+        if self.handle is None:
+            return False
+        self.load(sheets)
+        return all(name in self._ready for name in sheets)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def progress(self, sheets=()):
+        """``(fraction done, stage label)`` of the password check and loading ``sheets``."""
+        if self.handle is None:
+            return 0.0, "Checking password"
+        waiting = [name for name in sheets if name not in self._ready]
+        if not waiting:
+            return 1.0, "Done"
+        return (1 + len(sheets) - len(waiting)) / (1 + len(sheets)), f"Loading {waiting[0]}"
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _forget(job):
+    """Drop a failed ``job`` so a wrong password does not stay in ``_jobs`` for the life of the process."""
+    with _jobs_lock:
+        for key in [key for key, value in _jobs.items() if value is job]:
+            del _jobs[key]
+
+
+def start_unlock(password, path=WORKBOOK_PATH, record=False):
+    """Return the running or finished ``UnlockJob`` for ``path`` and ``password``, starting one if needed."""
+    key = (os.path.abspath(path), password_digest(password))
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is None or job.error is not None:
+            job = _jobs[key] = UnlockJob(path, password, record=record)
+        return job
@@ -0,0 +1,471 @@
+"""Decrypting, caching and hot-reloading the inventory workbook."""
+
+import hashlib
+import html
+import io
+import os
+import re
+import threading
+import time
+import zipfile
+from collections.abc import Mapping
+
+import pandas as pd
+from msoffcrypto.exceptions import InvalidKeyError
+
+from sptf_core.crypto import check_password, key_check, password_digest, unlock_workbook
+from sptf_core.shared import SharedStore, shared_available
+from sptf_core.snapshot import load_sheet_snapshot, snapshot_available, source_fingerprint, write_sheet_snapshot
+from sptf_core.timing import span
+
+WORKBOOK_PATH = os.environ.get("SPTF_WORKBOOK", "SPTF_Inventory_25.xlsx")
+WATCH_INTERVAL = float(os.environ.get("SPTF_WATCH_INTERVAL", "2"))
+USE_WATCHER = os.environ.get("SPTF_WATCH", "1") != "0"
+
+_SHEET = re.compile(rb"<sheet\b[^>]*>")
+_RELATIONSHIP = re.compile(rb"<Relationship\b[^>]*>")
+_SHARED_STRING = re.compile(rb"<si>.*?</si>", re.S)
+_SHARED_CELL = re.compile(rb'<c\b[^>]*\bt="s"[^>]*>\s*<v>(\d+)</v>')
+
+
+def file_identity(path):
+    """Return ``(absolute path, mtime_ns, size)``, which changes whenever the file is replaced."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _attribute(element, name):
+    match = re.search(rb'\b' + name + rb'="([^"]*)"', element)
+    return None if match is None else html.unescape(match.group(1).decode("utf-8"))
+
+
+def sheet_content_hashes(content):
+    """``{sheet name: SHA-256}`` of each worksheet's XML plus the shared strings it uses.
+
+    Returns None when ``content`` is not an XLSX package.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            targets = {}
+            for element in _RELATIONSHIP.findall(archive.read("xl/_rels/workbook.xml.rels")):
+                target = _attribute(element, rb"Target")
+                targets[_attribute(element, rb"Id")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+            try:
+                shared = _SHARED_STRING.findall(archive.read("xl/sharedStrings.xml"))
+            except KeyError:
+                shared = []
+            hashes = {}
+            for element in _SHEET.findall(archive.read("xl/workbook.xml")):
+                xml = archive.read(targets[_attribute(element, rb"r:id")])
+                digest = hashlib.sha256(xml)
+                for index in _SHARED_CELL.findall(xml):
+                    digest.update(shared[int(index)])
+                hashes[_attribute(element, rb"name")] = digest.hexdigest()
+            return hashes
+    except (zipfile.BadZipFile, KeyError, IndexError, AttributeError):
+        return None
+
+
+# Sheets read while a derived dataset is being built, per thread (builds can nest)
+_tracking = threading.local()
+
+
+def _record_sheets(names):
+    for used in getattr(_tracking, "stack", ()):
+        used.update(names)
+
+
+class LazyWorkbook(Mapping):
+    """Read-only ``{sheet name: DataFrame}`` mapping that parses each sheet on first access.
+
+    The workbook is decrypted once when the object is created (which also
+    checks the password) and ``version`` identifies its content; ``workbook["Sales"]`` then parses only the Sales
+    sheet, from its snapshot when there is one. ``workbook.sheet(name,
+    columns)`` reads only the given columns when the sheet has not been loaded
+    in full yet. ``sheet_version(*names)`` identifies the content of just those
+    sheets, and ``adopt(previous)`` carries over everything a previous version
+    parsed or derived from sheets that did not change.
+    """
+
+    def __init__(self, path, password):
+        self.path = path
+        stat = os.stat(path)
+        with open(path, "rb") as file:
+            content = file.read()
+        self._fingerprint = source_fingerprint(stat, content)
+        # Identifies this exact workbook content in cache keys
+        self.version = self._fingerprint["sha256"][:16]
+        self._source, self._secret_key = path, None
+        self._excel = None
+        self._frames = {}
+        self._lock = threading.RLock()
+        self._derived = {}
+        self._derived_sheets = {}
+        self._derive_locks = {}
+        self._sheet_hashes = None
+        self._open(content, password)
+
+    def _open(self, content, password):
+        """Decrypt ``content``, which also checks the password."""
+        with span("decrypt"):
+            unlocked = unlock_workbook(io.BytesIO(content), password)
+        if unlocked is not None:
+            self._source, self._secret_key = unlocked
+
+    def _excel_file(self):
+        if self._excel is None:
+            self._excel = pd.ExcelFile(self._source)
+        return self._excel
+
+    def _read(self, name, columns):
+        if self._secret_key is not None:
+            with span(f"snapshot {name}"):
+                frame = load_sheet_snapshot(self.path, name, self._secret_key, self._fingerprint, columns=columns)
+            if frame is not None:
+                return frame
+            if snapshot_available():
+                # Parse the whole sheet once so its snapshot can serve every later projection
+                with span(f"read_excel {name}"):
+                    frame = self._excel_file().parse(name)
+                with span(f"write snapshot {name}"):
+                    write_sheet_snapshot(self.path, name, frame, self._secret_key, self._fingerprint)
+                if columns is None:
+                    return frame
+                self._frames[(name, None)] = frame
+                return frame[list(columns)]
+        with span(f"read_excel {name}"):
+            return self._excel_file().parse(name, usecols=None if columns is None else list(columns))
+
+    def sheet(self, name, columns=None):
+        """Return sheet ``name``, optionally limited to ``columns``."""
+        _record_sheets([name])
+        key = (name, None if columns is None else tuple(columns))
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                full = self._frames.get((name, None))
+                if full is not None:
+                    frame = full[list(columns)]
+                else:
+                    frame = self._read(name, columns)
+                self._frames[key] = frame
+            return frame
+
+    def derive(self, key, build):
+        """Return ``build(self)``, computed once per workbook and shared by every session.
+
+        The sheets ``build`` reads are remembered, so a reload only rebuilds
+        datasets whose sheets changed.
+        """
+        with self._lock:
+            if key in self._derived:
+                _record_sheets(self._derived_sheets[key])
+                return self._derived[key]
+            key_lock = self._derive_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._derived:
+                used = set()
+                stack = _tracking.__dict__.setdefault("stack", [])
+                stack.append(used)
+                try:
+                    with span(f"derive {key}"):
+                        value = build(self)
+                finally:
+                    stack.pop()
+                with self._lock:
+                    self._derived[key] = value
+                    self._derived_sheets[key] = frozenset(used)
+        _record_sheets(self._derived_sheets[key])
+        return self._derived[key]
+
+    def sheet_hashes(self):
+        """``{sheet name: content hash}``; every sheet gets the file hash if the package cannot be read."""
+        with self._lock:
+            if self._sheet_hashes is None:
+                content = self._source.getvalue() if isinstance(self._source, io.BytesIO) else None
+                hashes = sheet_content_hashes(content) if content is not None else None
+                if hashes is None:
+                    hashes = {name: self._fingerprint["sha256"] for name in self.sheet_names()}
+                self._sheet_hashes = hashes
+            return self._sheet_hashes
+
+    def sheet_version(self, *names):
+        """Short hash identifying the content of ``names`` only."""
+        hashes = self.sheet_hashes()
+        digest = hashlib.sha256()
+        for name in names:
+            digest.update(f"{name}\0{hashes.get(name)}\0".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def adopt(self, previous):
+        """Take over ``previous``'s parsed sheets and derived datasets whose sheets are unchanged.
+
+        Returns the set of sheet names whose content changed.
+        """
+        old, new = previous.sheet_hashes(), self.sheet_hashes()
+        changed = {name for name in set(old) | set(new) if old.get(name) != new.get(name)}
+        with previous._lock:
+            frames = dict(previous._frames)
+            derived = {key: (value, previous._derived_sheets[key]) for key, value in previous._derived.items()}
+        with self._lock:
+            for (name, columns), frame in frames.items():
+                if name not in changed and (name, None) not in self._frames:
+                    self._frames.setdefault((name, columns), frame)
+                    if columns is None and self._secret_key is not None:
+                        write_sheet_snapshot(self.path, name, frame, self._secret_key, self._fingerprint)
+            for key, (value, used) in derived.items():
+                if not used & changed:
+                    self._derived.setdefault(key, value)
+                    self._derived_sheets.setdefault(key, used)
+        return changed
+
+    def sheet_names(self):
+        return list(self._excel_file().sheet_names)
+
+    def loaded_sheets(self):
+        return sorted({name for name, _ in self._frames})
+
+    def __getitem__(self, name):
+        try:
+            return self.sheet(name)
+        except ValueError as exc:
+            raise KeyError(name) from exc
+
+    def __iter__(self):
+        return iter(self.sheet_names())
+
+    def __len__(self):
+        return len(self.sheet_names())
+
+
+class SharedWorkbook(LazyWorkbook):
+    """``LazyWorkbook`` whose sheets live in shared memory, for running several server processes.
+
+    The first process to open a version of the workbook decrypts it, parses
+    every sheet and publishes them through ``sptf_core.shared``. The others
+    only derive the key from the password, check it against the published
+    check value and map the sheets, without decrypting or parsing anything.
+    Derived datasets are still built per process.
+    """
+
+    def __init__(self, path, password):
+        self._store = SharedStore(path)
+        self._dataset = None
+        super().__init__(path, password)
+
+    def _open(self, content, password):
+        source = self._fingerprint["sha256"]
+        check_message = f"sptf-shared-v1:{source}".encode("utf-8")
+        with self._store.transaction() as manifest:
+            entry = self._store.current(manifest, source)
+            decrypted = False
+            if entry is not None:
+                if not self._verify(content, password, entry["check"], check_message):
+                    super()._open(content, password)
+                    decrypted = True
+                try:
+                    with span("attach"):
+                        self._dataset = self._store.attach(manifest, entry)
+                except FileNotFoundError:
+                    # The segments are gone, e.g. a reboot cleared shared memory; publish them again
+                    pass
+            if self._dataset is None:
+                if not decrypted:
+                    super()._open(content, password)
+                with span("publish"):
+                    frames = {name: self.sheet(name) for name in self.sheet_names()}
+                    check = key_check(self._secret_key, check_message) if self._secret_key is not None else None
+                    entry = self._store.publish(manifest, source, frames, self.sheet_hashes(), check)
+                with span("attach"):
+                    self._dataset = self._store.attach(manifest, entry)
+        # Serve every sheet from the shared copy, including in the process that published it
+        self._frames = {(name, None): frame for name, frame in self._dataset.frames.items()}
+        self._sheet_hashes = self._dataset.sheet_hashes
+
+    def _verify(self, content, password, check, message):
+        """Check ``password`` against a published check value; False when only decrypting can tell."""
+        if check is None:  # unencrypted workbooks publish none
+            return True
+        with span("check password"):
+            verified = check_password(io.BytesIO(content), password, check, message)
+        if verified is False:
+            raise InvalidKeyError("Key verification failed")
+        return bool(verified)
+
+    def _read(self, name, columns):
+        if self._dataset is None:
+            return super()._read(name, columns)
+        raise ValueError(f"Worksheet named '{name}' not found")
+
+    def sheet_names(self):
+        if self._dataset is None:
+            return super().sheet_names()
+        return list(self._dataset.sheet_names)
+
+    def adopt(self, previous):
+        changed = super().adopt(previous)
+        if isinstance(previous, SharedWorkbook):
+            previous.release()
+        return changed
+
+    def release(self):
+        """Drop this workbook's reference on its shared generation once a newer version replaces it."""
+        if self._dataset is not None:
+            self._dataset.release()
+
+
+class WorkbookHandle:
+    """Stable reference to the newest version of a workbook opened with one password.
+
+    ``current`` is replaced in a single assignment once a new version is fully
+    decrypted, so a reader that takes ``handle.current`` once per rerun always
+    sees one consistent version. The handle keeps the password in memory so
+    the file can be reopened after it is saved again.
+    """
+
+    def __init__(self, path, password, loader=LazyWorkbook):
+        self.path = path
+        self._password = password
+        self._loader = loader
+        self._lock = threading.Lock()
+        self.identity = file_identity(path)
+        self.current = loader(path, password)
+        self.changed = frozenset()
+        self.error = None
+
+    def refresh(self, identity=None):
+        """Reopen the file if it changed since the last load; returns True when ``current`` was replaced."""
+        with self._lock:
+            identity = identity or file_identity(self.path)
+            if identity == self.identity:
+                return False
+            try:
+                with span("reload"):
+                    workbook = self._loader(self.path, self._password)
+                    previous = self.current
+                    changed = workbook.adopt(previous) if hasattr(workbook, "adopt") else None
+            except Exception as exc:  # keep serving the last good version
+                self.error = exc
+                return False
+            self.changed = frozenset(changed) if changed is not None else frozenset()
+            self.identity = identity
+            self.error = None
+            self.current = workbook
+            return True
+
+
+class WorkbookWatcher:
+    """Daemon thread that polls watched workbooks and reloads them in the background.
+
+    A change is acted on once the file's identity has been stable for one
+    poll, so a workbook that is still being written is not opened half-way.
+    """
+
+    def __init__(self, interval=WATCH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._handles = []
+        self._seen = {}
+        self._thread = None
+
+    def watch(self, handle):
+        with self._lock:
+            if handle not in self._handles:
+                self._handles.append(handle)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sptf-workbook-watcher", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, handle):
+        with self._lock:
+            if handle in self._handles:
+                self._handles.remove(handle)
+
+    def poll(self):
+        with self._lock:
+            handles = list(self._handles)
+        for handle in handles:
+            try:
+                identity = file_identity(handle.path)
+            except OSError:
+                continue
+            if identity != handle.identity and self._seen.get(id(handle)) == identity:
+                handle.refresh(identity)
+            self._seen[id(handle)] = identity
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.poll()
+
+
+workbook_watcher = WorkbookWatcher()
+
+
+class WorkbookCache:
+    """Process-wide cache of workbook handles.
+
+    Entries are keyed by path plus a salted password digest. Every session
+    that unlocks the same file gets the same ``WorkbookHandle``, whose
+    ``current`` workbook is read-only. With the watcher on (``SPTF_WATCH``, the
+    default) handles are reloaded in the background when the file changes;
+    otherwise a stale handle is refreshed by the next unlock. Concurrent
+    unlocks of the same key wait for a single decrypt.
+    """
+
+    def __init__(self, loader=LazyWorkbook, watcher=None):
+        self._loader = loader
+        self._watcher = watcher
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pending = {}
+
+    def get(self, path, password):
+        key = (os.path.abspath(path), password_digest(password))
+        with self._lock:
+            handle = self._entries.get(key)
+            if handle is None:
+                key_lock = self._pending.setdefault(key, threading.Lock())
+        if handle is not None:
+            if self._watcher is None:
+                handle.refresh()
+            return handle
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key]
+            try:
+                handle = WorkbookHandle(path, password, self._loader)
+                with self._lock:
+                    self._entries[key] = handle
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+        if self._watcher is not None:
+            self._watcher.watch(handle)
+        return handle
+
+    def evict(self, path=None):
+        """Drop every entry, or only those for ``path``."""
+        with self._lock:
+            keys = [key for key in self._entries if path is None or key[0] == os.path.abspath(path)]
+            handles = [self._entries.pop(key) for key in keys]
+        if self._watcher is not None:
+            for handle in handles:
+                self._watcher.unwatch(handle)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+workbook_cache = WorkbookCache(
+    loader=SharedWorkbook if shared_available() else LazyWorkbook,
+    watcher=workbook_watcher if USE_WATCHER else None,
+)
+
+
+def load_workbook(password, path=WORKBOOK_PATH):
+    """Return the shared ``WorkbookHandle`` for ``path``; read ``handle.current`` for the data."""
+    return workbook_cache.get(path, password)
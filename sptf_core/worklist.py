@@ -0,0 +1,190 @@
+"""Crew work lists behind the Current Inventory summary table.
+
+``SummaryTable(cells)`` rolls the selected inventory cells up once to one row
+per (Quality, Lot, Row, Tree Height (ft)); ``table.page(number, size,
+sort_by, ascending)`` returns the rows of a single page, so the browser only
+receives what is on screen. Each sort order is computed once per table (a
+stable argsort, categoricals in category order) and reused for every page.
+
+``start_export(cells, "csv" | "xlsx")`` returns an ``ExportJob`` at once and
+writes one work list per lot on a worker thread: a zip of ``Lot <n>.csv``
+files, or a workbook with one sheet per lot (openpyxl write-only mode). Lots
+are rolled up one at a time and written ``CHUNK_ROWS`` rows at a time to a
+temporary file, which is removed when the job is garbage collected.
+"""
+
+import io
+import os
+import re
+import tempfile
+import threading
+import weakref
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from sptf_core.cube import rollup
+
+SUMMARY_COLUMNS = ["Quality", "Lot", "Row", "Tree Height (ft)"]
+WORK_COLUMN = "Work Completed?"
+# Crews walk a lot row by row
+WORKLIST_ORDER = ["Row", "Tree Height (ft)", "Quality"]
+PAGE_SIZES = (25, 50, 100, 250)
+CHUNK_ROWS = 5000
+EXPORT_FORMATS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("zip", "application/zip"),
+}
+
+
+def _sort_values(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    return column.to_numpy()
+
+
+class SummaryTable:
+    """The summary rows of one inventory selection, served a page at a time."""
+
+    def __init__(self, cells):
+        self.frame = rollup(cells, SUMMARY_COLUMNS)
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def columns(self):
+        return [*self.frame.columns, WORK_COLUMN]
+
+    def page_count(self, size):
+        return max(1, -(-len(self) // size))
+
+    def order(self, sort_by, ascending=True):
+        """Row positions sorted by ``sort_by``; ties keep the table order in either direction."""
+        key = (sort_by, ascending)
+        if key not in self._orders:
+            values = _sort_values(self.frame[sort_by])
+            if ascending:
+                order = np.argsort(values, kind="stable")
+            else:
+                order = (len(values) - 1 - np.argsort(values[::-1], kind="stable"))[::-1]
+            self._orders[key] = order
+        return self._orders[key]
+
+    def page(self, number, size=PAGE_SIZES[0], sort_by=None, ascending=True):
+        """Rows of page ``number`` (from 0) with an empty ``Work Completed?`` column."""
+        start = number * size
+        if sort_by is None:
+            rows = self.frame.iloc[start : start + size]
+        else:
+            rows = self.frame.take(self.order(sort_by, ascending)[start : start + size])
+        return rows.assign(**{WORK_COLUMN: ""})
+
+
+def lot_worklists(cells):
+    """``(lot, rows)`` for every lot in ``cells``, each rolled up and ordered for the crew."""
+    for lot, lot_cells in cells.groupby("Lot", observed=True, sort=True):
+        rows = rollup(lot_cells, SUMMARY_COLUMNS).sort_values(WORKLIST_ORDER, kind="stable", ignore_index=True)
+        yield lot, rows.assign(**{WORK_COLUMN: ""})
+
+
+def _chunks(rows):
+    # An empty lot still gets its header
+    for start in range(0, max(len(rows), 1), CHUNK_ROWS):
+        yield start, rows.iloc[start : start + CHUNK_ROWS]
+
+
+def _sheet_title(lot):
+    return re.sub(r"[\[\]:*?/\\]", "-", f"Lot {lot}")[:31]
+
+
+def _write_csv(path, worklists, progress):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for done, (lot, rows) in enumerate(worklists):
+            with io.TextIOWrapper(archive.open(f"{_sheet_title(lot)}.csv", "w"), encoding="utf-8", newline="") as text:
+                for start, chunk in _chunks(rows):
+                    chunk.to_csv(text, index=False, header=start == 0)
+            progress(done + 1)
+
+
+def _write_xlsx(path, worklists, progress):
+    book = Workbook(write_only=True)
+    for done, (lot, rows) in enumerate(worklists):
+        sheet = book.create_sheet(_sheet_title(lot))
+        sheet.append(list(rows.columns))
+        for _, chunk in _chunks(rows):
+            # Python scalars, with blanks for missing values
+            for record in chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist():
+                sheet.append(record)
+        progress(done + 1)
+    if not book.worksheets:
+        book.create_sheet("Work List").append([*SUMMARY_COLUMNS, "Count", WORK_COLUMN])
+    book.save(path)
+
+
+def write_worklists(cells, path, fmt="xlsx", progress=None):
+    """Write the per-lot work lists for ``cells`` to ``path`` as ``fmt`` (``"xlsx"`` or ``"csv"``)."""
+    writer = {"xlsx": _write_xlsx, "csv": _write_csv}[fmt]
+    writer(path, lot_worklists(cells), progress or (lambda done: None))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExportJob:
+    def __init__(self, cells, fmt="xlsx"):
+        suffix, self.mime = EXPORT_FORMATS[fmt]
+        self.file_name = f"work_lists.{suffix}"
+        fd, self.path = tempfile.mkstemp(prefix="sptf-worklists-", suffix=f".{suffix}")
+        os.close(fd)
+        self._cleanup = weakref.finalize(self, _remove, self.path)
+        self.error = None
+        self._lots = int(cells["Lot"].nunique())
+        self._written = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(cells, fmt), name="sptf-export", daemon=True)
+        self._thread.start()
+
+    def _run(self, cells, fmt):
+        try:
+            write_worklists(cells, self.path, fmt, progress=self._progress)
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self._done.set()
+
+    def _progress(self, written):
+        self._written = written
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def progress(self):
+        """``(fraction done, stage label)``."""
+        if self.done:
+            return 1.0, "Done"
+        return self._written / max(self._lots, 1), f"Writing lot {self._written + 1} of {self._lots}"
+
+    def read(self):
+        """The finished file's bytes."""
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    def discard(self):
+        self._cleanup()
+
+
+def start_export(cells, fmt="xlsx"):
+    """Start writing the per-lot work lists for ``cells`` on a worker thread."""
+    return ExportJob(cells, fmt)
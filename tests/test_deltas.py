@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sptf_core.deltas import build_deltas  # noqa: E402
+
+QUALITIES = ["A", "B", "Cut", "C"]
+
+
+def cells(rows, qualities=QUALITIES):
+    frame = pd.DataFrame(rows, columns=["Inventory Year", "Lot", "Row", "Quality", "Tree Height (ft)", "Count"])
+    frame["Lot"] = pd.Categorical(frame["Lot"])
+    frame["Quality"] = pd.Categorical(frame["Quality"], categories=qualities, ordered=True)
+    return frame
+
+
+def test_counts_include_qualities_outside_the_filter_options():
+    # "C" is an old quality code the page filters do not offer
+    frame = cells(
+        [
+            (2024, "1", 1, "A", 5.0, 10),
+            (2024, "1", 1, "C", 5.0, 50),
+            (2025, "1", 1, "A", 6.0, 10),
+            (2025, "1", 1, "C", 6.0, 20),
+        ]
+    )
+    deltas = build_deltas(frame, [2024, 2025], pd.Series(dtype="int64"))
+    row = deltas.rows.iloc[0]
+    assert (row["Trees Before"], row["Trees After"], row["Change"], row["Lost"]) == (60, 30, -30, 30)
+    assert row["Growth (ft)"] == 1.0
+    assert deltas.reconciliation.iloc[0]["Lost"] == 30
+
+
+def test_downgrades_use_the_a_grade_wherever_it_is_listed():
+    rows = [
+        (2024, "1", 1, "A", 5.0, 40),
+        (2024, "1", 1, "B", 5.0, 10),
+        (2025, "1", 1, "A", 5.5, 25),
+        (2025, "1", 1, "B", 5.5, 20),
+    ]
+    sold = pd.Series(dtype="int64")
+    listed = build_deltas(cells(rows), [2024, 2025], sold).rows.iloc[0]["Downgraded"]
+    reordered = build_deltas(cells(rows, list(reversed(QUALITIES))), [2024, 2025], sold).rows.iloc[0]["Downgraded"]
+    assert listed == reordered == 10
+
+
+def test_no_downgrades_without_an_a_grade():
+    rows = [(2024, "1", 1, "B", 5.0, 40), (2025, "1", 1, "Cut", 5.5, 30)]
+    deltas = build_deltas(cells(rows, ["B", "Cut"]), [2024, 2025], pd.Series(dtype="int64"))
+    assert deltas.rows.iloc[0]["Downgraded"] == 0
@@ -0,0 +1,73 @@
+import io
+import os
+import sys
+
+import openpyxl
+import pytest
+from msoffcrypto.format.ooxml import OOXMLFile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+pytest.importorskip("pyarrow")
+
+from make_workbook import generate_sheets  # noqa: E402
+from sptf_core.history import HistoryStore  # noqa: E402
+from sptf_core.workbook import LazyWorkbook  # noqa: E402
+
+PASSWORD = "secret"
+
+
+def write_sheets(path, sheets):
+    workbook = openpyxl.Workbook(write_only=True)
+    for name, values in sheets.items():
+        sheet = workbook.create_sheet(name)
+        for row in values:
+            sheet.append(row)
+    plain = io.BytesIO()
+    workbook.save(plain)
+    plain.seek(0)
+    with open(path, "wb") as out:
+        OOXMLFile(plain).encrypt(PASSWORD, out)
+
+
+def with_repeats(sheets, copies=2):
+    """``sheets`` with the first data rows of Inventory and Sales repeated ``copies`` more times."""
+    repeated = dict(sheets)
+    for name in ("Inventory", "Sales"):
+        header, *rows = sheets[name]
+        repeated[name] = [header, *rows, *rows[:3] * copies]
+    return repeated
+
+
+def totals(frame):
+    column = "Count" if "Count" in frame else "Quantity"
+    return len(frame), int(frame[column].sum())
+
+
+def test_repeated_rows_in_one_workbook_are_kept(tmp_path):
+    path = tmp_path / "repeats.xlsx"
+    write_sheets(path, with_repeats(generate_sheets(200)))
+    store = HistoryStore(PASSWORD, root=str(tmp_path / "history"))
+    store.ingest(str(path), PASSWORD)
+
+    workbook = LazyWorkbook(str(path), PASSWORD)
+    for sheet in ("Inventory", "Sales"):
+        assert totals(store.read(sheet)) == totals(workbook[sheet])
+
+
+def test_rows_already_stored_are_not_written_again(tmp_path):
+    sheets = generate_sheets(200)
+    first, second = tmp_path / "first.xlsx", tmp_path / "second.xlsx"
+    write_sheets(first, sheets)
+    # The same season again, with three Sales lines now entered twice
+    header, *rows = sheets["Sales"]
+    write_sheets(second, {**sheets, "Sales": [header, *rows, *rows[:3]]})
+    store = HistoryStore(PASSWORD, root=str(tmp_path / "history"))
+    store.ingest(str(first), PASSWORD)
+    entry = store.ingest(str(second), PASSWORD)
+
+    assert totals(store.read("Sales")) == totals(LazyWorkbook(str(second), PASSWORD)["Sales"])
+    assert totals(store.read("Inventory")) == totals(LazyWorkbook(str(first), PASSWORD)["Inventory"])
+    assert entry["sheets"]["Inventory"]["partitions"] == {}